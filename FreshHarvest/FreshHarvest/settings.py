@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'fresh_harvest.middleware.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,13 +77,84 @@ WSGI_APPLICATION = 'FreshHarvest.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+SQLITE_OPTIONS = {
+    # Take the write lock when a transaction starts so concurrent
+    # checkouts queue up instead of failing on a lock upgrade.
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+    # Run on every new connection. In WAL mode readers no longer wait for
+    # the writer, and NORMAL only syncs to disk at checkpoints, which WAL
+    # keeps safe from corruption. The rest gives each connection a 32 MB
+    # page cache, in-memory temporary tables and memory-mapped reads.
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-32000;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=268435456'
+    ),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': SQLITE_OPTIONS,
+        # Keep connections open across requests instead of reconnecting for
+        # every one, checking them before reuse. SQLite has no server side
+        # pool; on PostgreSQL set CONN_MAX_AGE to 0 and add
+        # 'pool': {'min_size': 2, 'max_size': 10} to OPTIONS instead.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            # A file rather than the shared in-memory database, whose table
+            # locks fail immediately instead of waiting for the busy timeout.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Stands in for a read replica locally: a copy of the primary refreshed
+    # by the sync_replica command. Tests read the test primary through it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Read-only views read from DATABASE_REPLICA_ALIAS (routers.py); None keeps
+# every query on the primary. A user who changed their cart or an order reads
+# from the primary for DATABASE_REPLICA_STICKY_SECONDS, which should cover the
+# replica's lag.
+DATABASE_ROUTERS = ['fresh_harvest.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_ALIAS = None
+DATABASE_REPLICA_STICKY_SECONDS = 10
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The local-memory cache is per process. When running several workers,
+# point RESPONSE_CACHE_ALIAS at a shared backend such as
+# 'django.core.cache.backends.filebased.FileBasedCache' or
+# 'django.core.cache.backends.redis.RedisCache' so model version bumps
+# reach every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fresh-harvest',
+    },
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 15
+
+# Seconds a rendered cart is kept per user; 0 renders every cart read afresh.
+CART_CACHE_TIMEOUT = 60 * 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -102,6 +174,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New passwords are hashed with the first hasher; the others only verify
+# older hashes, which are upgraded on the user's next login.
+PASSWORD_HASHERS = [
+    'fresh_harvest.hashers.Argon2PasswordHasher',
+    'fresh_harvest.hashers.ScryptPasswordHasher',
+    'fresh_harvest.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Argon2id at the OWASP recommended minimum (19 MiB, 2 passes); changing
+# these makes existing hashes upgrade at login.
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = 19 * 1024
+PASSWORD_ARGON2_PARALLELISM = 1
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+# Hashes computed at once per process; further logins wait their turn.
+PASSWORD_HASHING_THREADS = 2
+
+# Token buckets on the token endpoints, as (burst, refills per second):
+# per email_or_phone on login, and per client IP on login and refresh.
+LOGIN_THROTTLE_PER_IDENTIFIER = (5, 1 / 60)
+LOGIN_THROTTLE_PER_IP = (20, 1 / 3)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -128,13 +224,70 @@ AUTH_USER_MODEL = 'fresh_harvest.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'fresh_harvest.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
+    # Throttles key clients on REMOTE_ADDR and ignore X-Forwarded-For, which
+    # any client can set. Behind load balancers or proxies, set this to their
+    # number so the address they append is used instead.
+    'NUM_PROXIES': 0,
+    # JSON goes through orjson when it is installed (renderers.py).
+    'DEFAULT_RENDERER_CLASSES': (
+        'fresh_harvest.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'fresh_harvest.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30), 
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),           
+    'TOKEN_OBTAIN_SERIALIZER': 'fresh_harvest.authentication.ClaimsTokenObtainPairSerializer',
 }
 
+# Users behind JWT requests are cached per process for this many seconds,
+# which bounds how long another process serves a changed user.
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_SECONDS = 60
+
+
+# Share of requests (0.0 - 1.0) whose queries and timings are recorded, and
+# how many recent samples per view the metrics endpoint keeps. Keep the rate
+# low in production.
+REQUEST_METRICS_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+REQUEST_METRICS_WINDOW = 500
+
+# Buffer review like/dislike clicks in memory and flush them in batches
+# instead of writing every click straight to the database.
+REVIEW_COUNTER_WRITE_BEHIND = False
+REVIEW_COUNTER_FLUSH_SECONDS = 2.0
+
+# Orders younger than this are left for the next analytics rollup run, so
+# checkouts still committing are not skipped by the high-water mark.
+ROLLUP_SETTLE_SECONDS = 60
+
+# Resized copies generated for every uploaded product and user image by a
+# background task: the longest edge of each rendition in pixels, and how they
+# are encoded and stored.
+IMAGE_RENDITIONS = {'thumbnail': 160, 'card': 480, 'full': 1600}
+IMAGE_RENDITION_FORMAT = 'WEBP'
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_ROOT = BASE_DIR / 'media' / 'renditions'
+IMAGE_RENDITION_URL = '/media/renditions/'
+
+# Background tasks (tasks.py). A failed task waits TASK_RETRY_BACKOFF_SECONDS,
+# doubling on every further failure up to the maximum, before it is retried.
+# A running task not finished within TASK_LEASE_SECONDS is assumed to have
+# lost its worker and is run again.
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BACKOFF_SECONDS = 10
+TASK_RETRY_BACKOFF_MAX_SECONDS = 60 * 60
+TASK_LEASE_SECONDS = 60 * 10
+
+# Seconds a cart line keeps its quantity of stock set aside for the shopper
+# (reservations.py). Every change to the line renews the hold.
+CART_HOLD_SECONDS = 60 * 15
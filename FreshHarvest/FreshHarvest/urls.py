@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path,include
 
@@ -21,3 +23,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('fresh_harvest.urls')),
 ]
+
+# Renditions are served by the web server in production.
+urlpatterns += static(settings.IMAGE_RENDITION_URL, document_root=settings.IMAGE_RENDITION_ROOT)
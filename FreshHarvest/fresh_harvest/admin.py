@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User,Product,Farmer,Farm,FarmProduct,Cart,CartItem,Review,Discount,Order,OrderItem,Recipe
+from .models import User,Product,Farmer,Farm,FarmProduct,Cart,CartItem,Review,Discount,Order,OrderItem,Recipe,Task,StockHold
 
 # Register your models here.
 admin.site.register(User)
@@ -13,4 +13,6 @@ admin.site.register(Review)
 admin.site.register(Discount)
 admin.site.register(Order)
 admin.site.register(OrderItem)
-admin.site.register(Recipe)
\ No newline at end of file
+admin.site.register(Recipe)
+admin.site.register(Task)
+admin.site.register(StockHold)
\ No newline at end of file
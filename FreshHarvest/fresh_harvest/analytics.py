@@ -0,0 +1,186 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, OrderItem, RollupState
+
+STATE_NAME = 'daily_sales'
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def _state():
+    state, _ = RollupState.objects.select_for_update().get_or_create(name=STATE_NAME)
+    return state
+
+
+def _line_totals(start, end):
+    """Per day and farm product totals of the order lines placed in ``(start, end]``."""
+    queryset = OrderItem.objects.filter(order__ordered_at__lte=end).exclude(order__status__in=EXCLUDED_STATUSES)
+    if start is not None:
+        queryset = queryset.filter(order__ordered_at__gt=start)
+    revenue = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField())
+    return (
+        queryset
+        .annotate(day=TruncDate('order__ordered_at'))
+        .values('day', 'farm_product_id', 'farm_product__farm_id', 'farm_product__product_id')
+        .annotate(units=Sum('quantity'), revenue=Sum(revenue), orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+
+
+def _merge(rows, batch_size):
+    """Add ``rows`` of line totals onto the stored rollups."""
+    rows = list(rows)
+    existing = {}
+    for day in {row['day'] for row in rows}:
+        farm_product_ids = [row['farm_product_id'] for row in rows if row['day'] == day]
+        for rollup in DailySales.objects.filter(day=day, farm_product_id__in=farm_product_ids):
+            existing[day, rollup.farm_product_id] = rollup
+
+    to_create = []
+    for row in rows:
+        rollup = existing.get((row['day'], row['farm_product_id']))
+        if rollup is None:
+            to_create.append(DailySales(
+                day=row['day'],
+                farm_product_id=row['farm_product_id'],
+                farm_id=row['farm_product__farm_id'],
+                product_id=row['farm_product__product_id'],
+                units=row['units'],
+                revenue=row['revenue'],
+                order_count=row['orders'],
+            ))
+            continue
+        rollup.units += row['units']
+        rollup.revenue += row['revenue']
+        rollup.order_count += row['orders']
+    DailySales.objects.bulk_create(to_create, batch_size=batch_size)
+    DailySales.objects.bulk_update(existing.values(), ['units', 'revenue', 'order_count'], batch_size=batch_size)
+
+
+def update_rollups(until=None, batch_size=2000):
+    """Fold order lines placed since the high-water mark into the daily rollups.
+
+    Only orders older than ``ROLLUP_SETTLE_SECONDS`` are taken, so a checkout
+    that commits late is still picked up by a later run. Returns the number
+    of rollup rows touched.
+    """
+    if until is None:
+        until = timezone.now() - timedelta(seconds=settings.ROLLUP_SETTLE_SECONDS)
+    touched = 0
+    with transaction.atomic():
+        state = _state()
+        if state.high_water_mark is not None and state.high_water_mark >= until:
+            return 0
+        chunk = []
+        for row in _line_totals(state.high_water_mark, until).iterator(chunk_size=batch_size):
+            chunk.append(row)
+            if len(chunk) >= batch_size:
+                _merge(chunk, batch_size)
+                touched += len(chunk)
+                chunk = []
+        _merge(chunk, batch_size)
+        touched += len(chunk)
+        state.high_water_mark = until
+        state.save()
+    return touched
+
+
+def backfill(since=None, days_per_batch=30, batch_size=2000):
+    """Rebuild the rollups from ``since`` (a date, or the first order) onwards.
+
+    Each window of ``days_per_batch`` days is rolled up in its own
+    transaction, so a long backfill can be interrupted and resumed with
+    update_rollups.
+    """
+    with transaction.atomic():
+        state = _state()
+        stale = DailySales.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+            state.high_water_mark = timezone.make_aware(datetime.combine(since, time.min)) - timedelta(microseconds=1)
+        else:
+            state.high_water_mark = None
+        stale.delete()
+        state.save()
+
+    end = timezone.now() - timedelta(seconds=settings.ROLLUP_SETTLE_SECONDS)
+    first = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES).order_by('order__ordered_at').values_list(
+        'order__ordered_at', flat=True).first()
+    if first is None:
+        return update_rollups(until=end, batch_size=batch_size)
+    first_day = timezone.localtime(first).date()
+    window = timezone.make_aware(datetime.combine(max(first_day, since or first_day), time.min))
+    touched = 0
+    while window < end:
+        window = min(window + timedelta(days=days_per_batch), end)
+        touched += update_rollups(until=window, batch_size=batch_size)
+    return touched
+
+
+def _rollups(start=None, end=None):
+    queryset = DailySales.objects.all()
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    return queryset
+
+
+def _rounded(rows):
+    # SQLite hands back sums of decimals unquantized.
+    cent = Decimal('0.01')
+    for row in rows:
+        for name in ('revenue', 'units'):
+            row[name] = row[name].quantize(cent)
+    return rows
+
+
+def revenue(group, start=None, end=None):
+    """Revenue, units and orders per ``day``, ``farm`` or ``product``."""
+    keys = {
+        'day': ('day',),
+        'farm': ('farm_id', 'farm__name'),
+        'product': ('product_id', 'product__name'),
+    }[group]
+    return _rounded(list(
+        _rollups(start, end).values(*keys)
+        .annotate(revenue=Sum('revenue'), units=Sum('units'), orders=Sum('order_count'))
+        .order_by(*keys)
+    ))
+
+
+def top_sellers(start=None, end=None, by='units', limit=10):
+    return _rounded(list(
+        _rollups(start, end).values('product_id', 'product__name')
+        .annotate(revenue=Sum('revenue'), units=Sum('units'))
+        .order_by(f'-{by}', 'product_id')[:limit]
+    ))
+
+
+def stock_depletion(days=14, limit=20, today=None):
+    """Farm products closest to selling out at their recent daily sales rate."""
+    today = today or timezone.localdate()
+    rows = (
+        _rollups(today - timedelta(days=days - 1), today)
+        .values('farm_product_id', 'farm_product__quantity')
+        .annotate(units=Sum('units'))
+        .order_by()
+    )
+    report = []
+    for row in rows:
+        rate = Decimal(row['units']) / days
+        quantity = row['farm_product__quantity']
+        report.append({
+            'farm_product_id': row['farm_product_id'],
+            'quantity': quantity,
+            'units_per_day': rate.quantize(Decimal('0.01')),
+            'days_left': (Decimal(quantity) / rate).quantize(Decimal('0.1')) if rate else None,
+        })
+    report.sort(key=lambda row: (row['days_left'] is None, row['days_left'] or 0, row['farm_product_id']))
+    return report[:limit]
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FreshHarvestConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fresh_harvest'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Registers the sweeper with the task queue.
+        from . import reservations  # noqa: F401
@@ -0,0 +1,199 @@
+"""Async-native versions of the read-only catalog endpoints.
+
+Everything a serializer touches is selected or prefetched up front, so
+serialization never reaches the database from the event loop.
+"""
+import base64
+import binascii
+import functools
+from datetime import datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from . import caching, renderers, routers
+from .models import Discount, Farm, Farmer, FarmProduct, Product, ProductImage, Recipe, Review
+from .pagination import FarmProductCursorPagination, SearchPagination
+from .serializers import DiscountSerializer, FarmProductSerializer, FarmerSerializer, RecipeSerializer
+from .views import FarmProductViewSet, get_number_param, reviews_prefetch, search_queryset
+
+FARM_PRODUCT_MODELS = (FarmProduct, Farm, Product, ProductImage, Review)
+SEARCH_ORDERING_FIELDS = ('price', 'rating_avg', 'rating_count')
+
+
+def api_view(func):
+    """GET-only async view reading from the replica and returning JSON, with API-style error bodies."""
+    @require_GET
+    @functools.wraps(func)
+    async def view(request, *args, **kwargs):
+        try:
+            with routers.replica_reads():
+                return await func(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400, safe=False)
+    return view
+
+
+async def cached_json(request, namespace, models, build):
+    """Return ``await build()`` as JSON through the versioned response cache."""
+    key = caching.response_key(namespace, request.get_full_path(), await caching.aget_versions(models))
+    etag = caching.etag_for(key)
+    if caching.etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    cache = caching.get_cache()
+    data = await cache.aget(key)
+    if data is None:
+        with routers.primary_reads():
+            data = await build()
+        await cache.aset(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    response = renderers.json_response(data)
+    response['ETag'] = etag
+    return response
+
+
+def page_size(params, pagination_class):
+    if not params.get(pagination_class.page_size_query_param):
+        return pagination_class.page_size
+    size = get_number_param(params, pagination_class.page_size_query_param, int)
+    return max(1, min(size, pagination_class.max_page_size))
+
+
+def encode_cursor(farm_product):
+    raw = f'{farm_product.created_at.isoformat()}|{farm_product.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def replace_query_param(request, **params):
+    query = request.GET.copy()
+    for name, value in params.items():
+        query[name] = value
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+async def fetch(queryset, chunk_size):
+    return [obj async for obj in queryset.aiterator(chunk_size=chunk_size)]
+
+
+async def get_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+@api_view
+async def farm_product_list(request):
+    async def build():
+        params = request.GET
+        size = page_size(params, FarmProductCursorPagination)
+        queryset = FarmProduct.objects.select_related('farm', 'product').prefetch_related(
+            'images', reviews_prefetch(FarmProductViewSet.review_preview_limit)
+        ).order_by('-created_at', '-id')
+        if params.get('min_rating'):
+            queryset = queryset.filter(rating_avg__gte=get_number_param(params, 'min_rating', Decimal))
+        if params.get('cursor'):
+            created_at, pk = decode_cursor(params['cursor'])
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        rows = await fetch(queryset[:size + 1], chunk_size=size + 1)
+        next_url = replace_query_param(request, cursor=encode_cursor(rows[size - 1])) if len(rows) > size else None
+        return {
+            'next': next_url,
+            'previous': None,
+            'results': FarmProductSerializer(rows[:size], many=True, context={'request': request}).data,
+        }
+    return await cached_json(request, 'async-farmproduct:list', FARM_PRODUCT_MODELS, build)
+
+
+@api_view
+async def farm_product_detail(request, pk):
+    async def build():
+        queryset = FarmProduct.objects.select_related('farm', 'product').prefetch_related('images', reviews_prefetch())
+        return FarmProductSerializer(await get_or_404(queryset, pk=pk), context={'request': request}).data
+    return await cached_json(request, 'async-farmproduct:retrieve', FARM_PRODUCT_MODELS, build)
+
+
+@api_view
+async def search_list(request):
+    # Building the search queryset looks up matching index terms, which is
+    # sync ORM work, so it runs in a worker thread.
+    params = request.GET
+    queryset = await sync_to_async(search_queryset)(params, FarmProductViewSet.review_preview_limit)
+    ordering = params.get('ordering', '')
+    if ordering.lstrip('-') in SEARCH_ORDERING_FIELDS:
+        queryset = queryset.order_by(ordering, 'pk')
+
+    size = page_size(params, SearchPagination)
+    page = get_number_param(params, 'page', int) if params.get('page') else 1
+    if page < 1:
+        raise ValidationError({'page': 'Invalid page.'})
+    count = await queryset.acount()
+    offset = (page - 1) * size
+    rows = await fetch(queryset[offset:offset + size], chunk_size=size)
+    return renderers.json_response({
+        'count': count,
+        'next': replace_query_param(request, page=page + 1) if offset + size < count else None,
+        'previous': replace_query_param(request, page=page - 1) if page > 1 else None,
+        'results': FarmProductSerializer(rows, many=True, context={'request': request}).data,
+    })
+
+
+@api_view
+async def farmer_list(request):
+    async def build():
+        return FarmerSerializer(await fetch(Farmer.objects.order_by('name'), chunk_size=500), many=True, context={'request': request}).data
+    return await cached_json(request, 'async-farmer:list', (Farmer,), build)
+
+
+@api_view
+async def farmer_detail(request, pk):
+    async def build():
+        return FarmerSerializer(await get_or_404(Farmer.objects.all(), pk=pk), context={'request': request}).data
+    return await cached_json(request, 'async-farmer:retrieve', (Farmer,), build)
+
+
+@api_view
+async def recipe_list(request):
+    async def build():
+        recipes = await fetch(Recipe.objects.prefetch_related('products').order_by('pk'), chunk_size=500)
+        return RecipeSerializer(recipes, many=True, context={'request': request}).data
+    return await cached_json(request, 'async-recipe:list', (Recipe, Product), build)
+
+
+@api_view
+async def recipe_detail(request, pk):
+    async def build():
+        return RecipeSerializer(await get_or_404(Recipe.objects.prefetch_related('products'), pk=pk), context={'request': request}).data
+    return await cached_json(request, 'async-recipe:retrieve', (Recipe, Product), build)
+
+
+@api_view
+async def discount_list(request):
+    async def build():
+        return DiscountSerializer(await fetch(Discount.objects.all(), chunk_size=500), many=True, context={'request': request}).data
+    return await cached_json(request, 'async-discount:list', (Discount,), build)
+
+
+@api_view
+async def discount_detail(request, coupon_code):
+    async def build():
+        return DiscountSerializer(await get_or_404(Discount.objects.all(), coupon_code=coupon_code), context={'request': request}).data
+    return await cached_json(request, 'async-discount:retrieve', (Discount,), build)
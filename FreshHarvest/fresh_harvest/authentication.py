@@ -0,0 +1,136 @@
+"""JWT authentication served from an in-process cache of users.
+
+simplejwt's JWTAuthentication loads the whole user row on every request.
+CachedJWTAuthentication keeps the few fields authentication and permission
+checks read in a small LRU cache with a TTL, and hands views a User whose
+other fields are deferred, so ``location`` or ``image`` are only loaded by
+a view that reads them.
+
+The cache is per process: saving a user drops its entry in the process
+that saved it, other processes pick the change up within
+``AUTH_USER_CACHE_SECONDS``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+# Everything authentication and the permission classes read.
+CACHED_FIELDS = ('id', 'username', 'email_or_phone', 'name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserCache:
+    """Thread-safe LRU cache of user field values that expire after ``ttl`` seconds."""
+
+    def __init__(self, size=10000, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UserCache(size=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_SECONDS)
+        return _cache
+
+
+def cached_fields():
+    if api_settings.CHECK_REVOKE_TOKEN:
+        return CACHED_FIELDS + ('password',)
+    return CACHED_FIELDS
+
+
+def get_cached_user(user_id):
+    """A User with only the cached fields loaded, or ``None`` if there is none."""
+    cache = get_user_cache()
+    # Tokens carry the id as a string.
+    values = cache.get(str(user_id))
+    if values is None:
+        values = User.objects.filter(pk=user_id).values(*cached_fields()).first()
+        if values is None:
+            return None
+        cache.set(str(user_id), values)
+    # from_db wants the loaded values in model field order; the rest are deferred.
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(User.objects.db, names, [values[name] for name in names])
+
+
+def forget_user(user_id):
+    get_user_cache().invalidate(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Tokens that also carry the user's name and staff flag for clients.
+
+    The server still checks the cached user, so deactivating a user or
+    revoking staff does not wait for their tokens to expire.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['name'] = user.name
+        token['is_staff'] = user.is_staff
+        return token
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from . import tasks
+from .models import FarmProduct, Product, ProductOffer
+
+CHUNK_SIZE = 500
+
+
+def best_offers(product_ids):
+    """Map each product id to its cheapest in-stock farm product.
+
+    Each product costs one seek on the partial (product, price) index of
+    in-stock farm products, however many farms sell it.
+    """
+    cheapest = FarmProduct.objects.filter(product=OuterRef('pk'), quantity__gt=0).order_by('price', 'id')
+    best = dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(best=Subquery(cheapest.values('pk')[:1]))
+        .exclude(best=None)
+        .values_list('pk', 'best')
+    )
+    return {
+        farm_product.product_id: farm_product
+        for farm_product in FarmProduct.objects.filter(pk__in=best.values()).only('product_id', 'price', 'quantity')
+    }
+
+
+@tasks.task('refresh_offers', priority=10)
+def refresh(product_ids):
+    """Recompute the stored best offer of the given products."""
+    product_ids = sorted({pk for pk in product_ids if pk is not None})
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        offers = best_offers(chunk)
+        with transaction.atomic():
+            ProductOffer.objects.filter(product_id__in=chunk).exclude(product_id__in=offers).delete()
+            ProductOffer.objects.bulk_create(
+                [
+                    ProductOffer(product_id=product_id, farm_product_id=farm_product.pk,
+                                 price=farm_product.price, quantity=farm_product.quantity)
+                    for product_id, farm_product in offers.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['farm_product', 'price', 'quantity', 'updated_at'],
+            )
+
+
+def refresh_for_farm_product(farm_product):
+    """Refresh the product of ``farm_product`` and any product it was the offer for."""
+    product_ids = set(ProductOffer.objects.filter(farm_product_id=farm_product.pk).values_list('product_id', flat=True))
+    product_ids.add(farm_product.product_id)
+    refresh(product_ids)
+
+
+def rebuild():
+    refresh(Product.objects.values_list('pk', flat=True))
@@ -0,0 +1,256 @@
+import asyncio
+import io
+import json
+import math
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Prefetch
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from . import caching, carts, renderers
+from .models import CartItem, Discount, Farmer, FarmProduct, Order, OrderItem, Recipe, Review, User
+
+API_PREFIX = '/api/v1'
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def endpoints(user=None):
+    """Return ``(name, method, path, data)`` for the routed read endpoints.
+
+    Detail routes use the first row of each model; authenticated routes are
+    only included when a ``user`` is given. Write routes are left out so a
+    run does not change the data it measures.
+    """
+    farm_product = FarmProduct.objects.order_by('pk').first()
+    farmer = Farmer.objects.order_by('pk').first()
+    discount = Discount.objects.order_by('pk').first()
+    recipe = Recipe.objects.order_by('pk').first()
+    review = Review.objects.order_by('pk').first()
+    product_name = farm_product.product.name.split()[-1] if farm_product else 'apple'
+
+    routes = [
+        ('farm-products list', 'get', '/farm-products/', None),
+        ('search', 'get', '/search/', {'q': product_name}),
+        ('search filtered', 'get', '/search/', {'q': product_name, 'max_price': '20', 'ordering': '-rating_avg'}),
+        ('farmers list', 'get', '/farmers/', None),
+        ('discounts list', 'get', '/discounts/', None),
+        ('recipe list', 'get', '/recipe/', None),
+        ('reviews list', 'get', '/reviews/', None),
+    ]
+    if farm_product:
+        routes += [
+            ('farm-products retrieve', 'get', f'/farm-products/{farm_product.pk}/', None),
+            ('farm-products reviews', 'get', f'/farm-products/{farm_product.pk}/reviews/', None),
+        ]
+    if farmer:
+        routes.append(('farmers retrieve', 'get', f'/farmers/{farmer.pk}/', None))
+    if discount:
+        routes.append(('discounts retrieve', 'get', f'/discounts/{discount.pk}/', None))
+    if recipe:
+        routes.append(('recipe retrieve', 'get', f'/recipe/{recipe.pk}/', None))
+    if review:
+        routes.append(('reviews retrieve', 'get', f'/reviews/{review.pk}/', None))
+    if user is not None:
+        routes += [
+            ('cart list', 'get', '/cart/', None),
+            ('orders list', 'get', '/orders/', None),
+        ]
+        order = Order.objects.filter(user=user).order_by('pk').first()
+        if order:
+            routes.append(('orders retrieve', 'get', f'/orders/{order.pk}/', None))
+    return [(name, method, API_PREFIX + path, data) for name, method, path, data in routes]
+
+
+def pick_user():
+    """The user with the most orders, so order history has something to show."""
+    busiest = Order.objects.values('user').annotate(total=Count('id')).order_by('-total').first()
+    if busiest:
+        return User.objects.get(pk=busiest['user'])
+    return User.objects.order_by('pk').first()
+
+
+def run(iterations=20, warmup=2, cold=False, user=None, host='localhost'):
+    """Drive every endpoint through the test client and collect timings.
+
+    With ``cold`` the response cache is cleared before every request so
+    the numbers reflect the database and serializers rather than cache hits.
+    """
+    client = Client(HTTP_HOST=host)
+    if user is not None:
+        client.force_login(user)
+    results = {}
+    for name, method, path, data in endpoints(user):
+        request = getattr(client, method)
+        timings = []
+        queries = 0
+        status = None
+        for i in range(warmup + iterations):
+            if cold:
+                caching.get_cache().clear()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = request(path, data)
+                elapsed = (time.perf_counter() - start) * 1000
+            status = response.status_code
+            if i >= warmup:
+                timings.append(elapsed)
+                queries = max(queries, len(ctx.captured_queries))
+        timings.sort()
+        results[name] = {
+            'path': path,
+            'status': status,
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=1.25):
+    """List regressions of ``results`` against a stored ``baseline``.
+
+    An endpoint regresses when it issues more queries than before or its
+    p95 latency grows beyond ``tolerance`` times the baseline.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {previous['queries']} -> {current['queries']} queries")
+        if current['p95_ms'] > previous['p95_ms'] * tolerance:
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+# Pairs of equivalent sync (DRF) and async-native read endpoints.
+SYNC_ASYNC_PAIRS = (
+    ('farm-products list', '/farm-products/', '/async/farm-products/'),
+    ('search', '/search/?q=apple', '/async/search/?q=apple'),
+    ('farmers list', '/farmers/', '/async/farmers/'),
+    ('recipe list', '/recipe/', '/async/recipe/'),
+    ('discounts list', '/discounts/', '/async/discounts/'),
+)
+
+
+async def _drive(path, concurrency, total, cold):
+    client = AsyncClient()
+    timings = []
+    statuses = set()
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            if cold:
+                caching.get_cache().clear()
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses.add(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return {
+        'path': path,
+        'statuses': sorted(statuses),
+        'requests_per_second': round(total / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+    }
+
+
+def run_concurrent(concurrency=20, total=200, cold=False):
+    """Compare sync and async endpoints under concurrent in-process ASGI clients.
+
+    Each request goes through Django's ASGI handler, so sync views are run
+    through the handler's thread adapter exactly as under an ASGI server.
+    The async test client always sends ``testserver`` as its host, so that
+    host is allowed for the duration of the run.
+    """
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name, sync_path, async_path in SYNC_ASYNC_PAIRS:
+            results[name] = {
+                'sync': asyncio.run(_drive(API_PREFIX + sync_path, concurrency, total, cold)),
+                'async': asyncio.run(_drive(API_PREFIX + async_path, concurrency, total, cold)),
+            }
+    return results
+
+
+def json_payloads():
+    """Serialized catalog, cart and order data as the API renders it."""
+    from .fieldsets import FieldSelection
+    from .serializers import FarmProductSerializer, OrderDetailSerializer
+    from .views import FarmProductViewSet, farm_product_relations
+
+    farm_products = farm_product_relations(
+        FarmProduct.objects.order_by('-created_at', '-id'), FieldSelection(), FarmProductViewSet.review_preview_limit,
+    )[:20]
+    user = pick_user()
+    orders = Order.objects.filter(user=user).prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.order_by('id'))
+    ).order_by('-ordered_at', '-id')[:20]
+    busiest_cart = CartItem.objects.values('cart__user').annotate(lines=Count('id')).order_by('-lines').first()
+    cart_user = User.objects.get(pk=busiest_cart['cart__user']) if busiest_cart else user
+    return {
+        'catalog page': FarmProductSerializer(farm_products, many=True).data,
+        'cart': carts.build_snapshot(cart_user),
+        'order history': OrderDetailSerializer(orders, many=True).data,
+    }
+
+
+def json_backends():
+    """The stdlib renderer and parser DRF ships with, and orjson's if it is installed."""
+    backends = {'stdlib': (JSONRenderer(), JSONParser())}
+    if renderers.orjson is not None:
+        backends['orjson'] = (renderers.FastJSONRenderer(), renderers.FastJSONParser())
+    return backends
+
+
+def _bytes_per_second(func, size, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round(size * iterations / (time.perf_counter() - start))
+
+
+def run_json(iterations=200):
+    """Render and parse every payload with every backend and report bytes per second."""
+    results = {}
+    for name, data in json_payloads().items():
+        results[name] = {}
+        for backend, (renderer, parser) in json_backends().items():
+            body = renderer.render(data)
+            results[name][backend] = {
+                'bytes': len(body),
+                'render_bytes_per_second': _bytes_per_second(lambda: renderer.render(data), len(body), iterations),
+                'parse_bytes_per_second': _bytes_per_second(
+                    lambda: parser.parse(io.BytesIO(body)), len(body), iterations,
+                ),
+            }
+    return results
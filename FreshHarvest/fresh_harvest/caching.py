@@ -0,0 +1,127 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import routers
+
+VERSION_KEY_PREFIX = 'model-version'
+RESPONSE_KEY_PREFIX = 'response'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def version_key(model):
+    return f'{VERSION_KEY_PREFIX}:{model._meta.label_lower}'
+
+
+def _initial_version():
+    # Start from the clock rather than 0 so a version key that was evicted
+    # never comes back with a value an older cached response was built on.
+    return int(time.time() * 1000)
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(models):
+    cache = get_cache()
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def bump_version(*models):
+    _bump(models)
+    # Bump again once the surrounding transaction commits, so a response
+    # cached from the pre-commit state in the meantime is not served.
+    transaction.on_commit(lambda: _bump(models))
+
+
+async def aget_versions(models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, _initial_version(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def response_key(namespace, path, versions):
+    raw = f"{namespace}:{path}:{':'.join(str(version) for version in versions)}"
+    return f'{RESPONSE_KEY_PREFIX}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def etag_for(key):
+    return quote_etag(key.rsplit(':', 1)[-1])
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+
+
+class CachedResponseMixin:
+    """Serve list/retrieve responses from the response cache.
+
+    Entries are keyed on the request path and the current version of every
+    model in ``cache_models``. Saving or deleting any of those models bumps
+    its version, so stale entries are simply never looked up again. The same
+    key doubles as the ETag, which lets a client revalidate with
+    ``If-None-Match`` for a 304 without any serialization. Misses are built
+    from the primary, see routers.py.
+    """
+    cache_models = ()
+    cached_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        return response_key(f'{self.basename}:{self.action}', request.get_full_path(), get_versions(self.cache_models))
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.cached_actions or request.method != 'GET':
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        etag = etag_for(key)
+        headers = {'ETag': etag}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers=headers)
+
+        with routers.primary_reads():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db.models import Prefetch
+
+from . import caching
+from .models import Cart, CartItem, Farm, FarmProduct, Product, ProductImage
+
+# Models whose changes alter how an unchanged cart renders (prices, names,
+# thumbnails), on top of the explicit invalidation on cart mutations.
+SNAPSHOT_MODELS = (FarmProduct, Farm, Product, ProductImage)
+
+
+def cart_items_queryset():
+    return CartItem.objects.select_related('product__farm', 'product__product', 'hold').prefetch_related(
+        Prefetch('product__images', queryset=ProductImage.objects.order_by('id'))
+    ).order_by('id')
+
+
+def cart_key(user_id):
+    return f'cart:{user_id}'
+
+
+def invalidate_cart(user_id):
+    caching.get_cache().delete(cart_key(user_id))
+
+
+def build_snapshot(user):
+    from .serializers import CartSummarySerializer
+
+    cart = Cart.objects.filter(user=user).prefetch_related(
+        Prefetch('cart_items', queryset=cart_items_queryset())
+    ).first()
+    if cart is None:
+        return {'id': None, 'active': False, 'items': [], 'item_count': 0, 'subtotal': '0.00'}
+    return CartSummarySerializer(cart).data
+
+
+def get_snapshot(user):
+    timeout = settings.CART_CACHE_TIMEOUT
+    if not timeout:
+        return build_snapshot(user)
+
+    cache = caching.get_cache()
+    versions = caching.get_versions(SNAPSHOT_MODELS)
+    cached = cache.get(cart_key(user.pk))
+    if cached is not None and cached['versions'] == versions:
+        return cached['data']
+    data = build_snapshot(user)
+    cache.set(cart_key(user.pk), {'versions': versions, 'data': data}, timeout=timeout)
+    return data
@@ -0,0 +1,109 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import caching
+from .models import Review
+
+COUNTER_FIELDS = ('likes', 'dislikes')
+
+
+def _empty_counts():
+    return dict.fromkeys(COUNTER_FIELDS, 0)
+
+
+def increment(review_id, field):
+    """Bump one review counter in the database and return the fresh counts.
+
+    Returns ``None`` when the review does not exist.
+    """
+    updated = Review.objects.filter(pk=review_id).update(**{field: F(field) + 1})
+    if not updated:
+        return None
+    caching.bump_version(Review)
+    return Review.objects.values(*COUNTER_FIELDS).get(pk=review_id)
+
+
+class ReviewCounterBuffer:
+    """Per-process write-behind buffer for review like/dislike clicks.
+
+    Increments accumulate in memory and a timer thread flushes them as one
+    UPDATE per batch, so a burst of clicks on one review costs a single write.
+    """
+
+    def __init__(self, interval=2.0, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = defaultdict(_empty_counts)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, review_id, field):
+        with self._lock:
+            self._pending[review_id][field] += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def pending(self, review_id):
+        with self._lock:
+            return dict(self._pending.get(review_id) or _empty_counts())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(_empty_counts)
+            self._timer = None
+        if not pending:
+            return
+        try:
+            self._write(pending)
+        except Exception:
+            # Put the clicks back so the next flush retries them.
+            with self._lock:
+                for review_id, counts in pending.items():
+                    for field, count in counts.items():
+                        self._pending[review_id][field] += count
+            raise
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def _write(self, pending):
+        review_ids = list(pending)
+        with transaction.atomic():
+            for start in range(0, len(review_ids), self.batch_size):
+                batch = review_ids[start:start + self.batch_size]
+                Review.objects.filter(pk__in=batch).update(**{
+                    field: F(field) + Case(
+                        *[When(pk=pk, then=Value(pending[pk][field])) for pk in batch],
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                    for field in COUNTER_FIELDS
+                })
+        caching.bump_version(Review)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = ReviewCounterBuffer(interval=getattr(settings, 'REVIEW_COUNTER_FLUSH_SECONDS', 2.0))
+            atexit.register(_buffer.flush)
+        return _buffer
+
+
+def write_behind_enabled():
+    return getattr(settings, 'REVIEW_COUNTER_WRITE_BEHIND', False)
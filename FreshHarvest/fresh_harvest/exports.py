@@ -0,0 +1,136 @@
+import csv
+import datetime
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import FarmProduct, Order, OrderItem
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CATALOG_FIELDS = (
+    'id', 'farm_id', 'farm__name', 'product_id', 'product__name', 'product__type', 'quantity', 'price',
+    'label', 'harvest_date', 'rating_avg', 'rating_count', 'created_at', 'updated_at',
+)
+ORDER_FIELDS = ('id', 'user_id', 'status', 'total_bill', 'coupon_id', 'ordered_at', 'created_at', 'updated_at')
+ORDER_ITEM_FIELDS = ('id', 'farm_product_id', 'product_name', 'farm_name', 'unit_price', 'quantity')
+
+
+def parse_watermark(value):
+    """Parse an ISO 8601 ``since`` value, or return ``None`` if it is not one."""
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def window(queryset, since=None, until=None):
+    """Rows changed after ``since`` and up to ``until``, oldest change first.
+
+    ``until`` is fixed before the export starts so rows saved while it is
+    streaming are left for the next run, which passes it back as ``since``.
+    """
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lte=until)
+    return queryset.order_by('updated_at', 'id')
+
+
+def catalog_rows(since=None, until=None, chunk_size=2000):
+    queryset = window(FarmProduct.objects.all(), since, until).values(*CATALOG_FIELDS)
+    yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def order_rows(since=None, until=None, chunk_size=2000):
+    """Orders with their line items nested under ``items``."""
+    items = OrderItem.objects.order_by('id').only('order_id', *ORDER_ITEM_FIELDS)
+    queryset = window(Order.objects.all(), since, until).prefetch_related(
+        Prefetch('order_items', queryset=items)
+    )
+    # With a chunk_size the prefetch runs once per chunk rather than once
+    # for the whole result.
+    for order in queryset.iterator(chunk_size=chunk_size):
+        row = {field: getattr(order, field) for field in ORDER_FIELDS}
+        row['items'] = [
+            {field: getattr(item, field) for field in ORDER_ITEM_FIELDS}
+            for item in order.order_items.all()
+        ]
+        yield row
+
+
+def flatten_orders(rows):
+    """One CSV row per order line, repeating the order columns."""
+    for row in rows:
+        items = row.pop('items') or [dict.fromkeys(ORDER_ITEM_FIELDS)]
+        for item in items:
+            yield {**row, **{f'item_{field}': value for field, value in item.items()}}
+
+
+def order_csv_fields():
+    return ORDER_FIELDS + tuple(f'item_{field}' for field in ORDER_ITEM_FIELDS)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.DictWriter(_Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream(kind, output_format, since=None, until=None, chunk_size=2000):
+    """Return the lines of a ``catalog`` or ``orders`` export as a generator."""
+    if kind == 'catalog':
+        rows = catalog_rows(since, until, chunk_size)
+        fields = CATALOG_FIELDS
+    else:
+        rows = order_rows(since, until, chunk_size)
+        if output_format == 'csv':
+            rows = flatten_orders(rows)
+        fields = order_csv_fields()
+    if output_format == 'csv':
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows)
+
+
+async def aiterate(lines, batch_size=500):
+    """Hand the sync generator ``lines`` to an async consumer.
+
+    Under ASGI Django reads a sync iterator into memory before sending it,
+    so exports served there go through this instead. Every batch is read
+    in the request's sync thread, where the database cursor lives.
+    """
+    def next_batch():
+        return list(itertools.islice(lines, batch_size))
+
+    try:
+        while batch := await sync_to_async(next_batch)():
+            for line in batch:
+                yield line
+    finally:
+        await sync_to_async(lines.close)()
@@ -0,0 +1,96 @@
+"""Sparse fieldsets (``?fields=``) and expansion (``?expand=``) for read endpoints.
+
+Both parameters take comma separated field names, with dots reaching into
+nested objects: ``?fields=id,price,product.name`` keeps three fields, and
+``?expand=order_items.farm_product`` renders that relation as a nested
+object rather than its id. Views use the same selection to decide which
+relations to select or prefetch, so an unrequested one is never queried.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+def parse(value):
+    """Parse ``a,b.c,b.d`` into ``{'a': {}, 'b': {'c': {}, 'd': {}}}``."""
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class FieldSelection:
+    """The requested fields of one serializer level; ``fields`` of ``None`` means all."""
+
+    def __init__(self, fields=None, expand=None, prefix=''):
+        self.fields = fields
+        self.expand = expand or {}
+        self.prefix = prefix
+
+    @classmethod
+    def from_params(cls, params):
+        fields = params.get('fields')
+        return cls(parse(fields) if fields else None, parse(params.get('expand') or ''))
+
+    def child(self, name):
+        fields = None if self.fields is None else self.fields.get(name) or None
+        return FieldSelection(fields, self.expand.get(name), f'{self.prefix}{name}.')
+
+    def _walk(self, path):
+        selection = self
+        *parents, name = path.split('.')
+        for parent in parents:
+            if not selection.includes(parent):
+                return None, name
+            selection = selection.child(parent)
+        return selection, name
+
+    def includes(self, path):
+        """Whether the field at dotted ``path`` is rendered."""
+        selection, name = self._walk(path)
+        return selection is not None and (selection.fields is None or name in selection.fields)
+
+    def expands(self, path):
+        """Whether the field at dotted ``path`` is rendered and expanded."""
+        selection, name = self._walk(path)
+        return self.includes(path) and name in selection.expand
+
+    def check(self, available, expandable=()):
+        """Reject requested names that are not among the ``available`` fields."""
+        unknown = [name for name in self.fields or () if name not in available]
+        if unknown:
+            raise ValidationError({'fields': f'Unknown field: {self.prefix}{unknown[0]}'})
+        unknown = [name for name in self.expand if name not in expandable and name not in available]
+        if unknown:
+            raise ValidationError({'expand': f'Cannot expand: {self.prefix}{unknown[0]}'})
+
+    def filter(self, data):
+        """Apply the selection to already serialized ``data``."""
+        if isinstance(data, list):
+            return [self.filter(item) for item in data]
+        if not isinstance(data, dict) or self.fields is None:
+            return data
+        self.check(data)
+        return {name: self.child(name).filter(value) for name, value in data.items() if name in self.fields}
+
+
+class FieldSelectionMixin:
+    """Hand the request's field selection to the serializers of a view.
+
+    Only reads are trimmed; writes always see every field.
+    """
+
+    @property
+    def field_selection(self):
+        if getattr(self, '_field_selection', None) is None:
+            if self.request.method == 'GET':
+                self._field_selection = FieldSelection.from_params(self.request.query_params)
+            else:
+                self._field_selection = FieldSelection()
+        return self._field_selection
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'field_selection': self.field_selection}
@@ -0,0 +1,71 @@
+"""Password hashers with their cost taken from settings and a cap on concurrency.
+
+Which hasher new passwords use is the first entry of ``PASSWORD_HASHERS``.
+Django rehashes a password with it on the next successful login whenever
+the stored hash uses another hasher or other cost parameters, so changing
+the policy upgrades existing users as they log in.
+
+Every hash and verification runs on a pool of ``PASSWORD_HASHING_THREADS``
+threads. A burst of logins then queues for the pool instead of taking every
+CPU away from the rest of the site, whether the request thread is a WSGI
+worker or one of the threads ASGI runs sync views on.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = None
+_executor_lock = threading.Lock()
+_pool_thread = threading.local()
+
+
+def _mark_pool_thread():
+    _pool_thread.active = True
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_THREADS, thread_name_prefix='password-hashing',
+                initializer=_mark_pool_thread,
+            )
+        return _executor
+
+
+def run_bounded(func, *args, **kwargs):
+    # verify() of most hashers calls encode(); waiting on the pool from
+    # inside it could deadlock a full pool.
+    if getattr(_pool_thread, 'active', False):
+        return func(*args, **kwargs)
+    return get_executor().submit(func, *args, **kwargs).result()
+
+
+class BoundedHasherMixin:
+    def encode(self, password, salt, *args, **kwargs):
+        return run_bounded(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run_bounded(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return run_bounded(super().harden_runtime, password, encoded)
+
+
+class Argon2PasswordHasher(BoundedHasherMixin, hashers.Argon2PasswordHasher):
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class ScryptPasswordHasher(BoundedHasherMixin, hashers.ScryptPasswordHasher):
+    work_factor = settings.PASSWORD_SCRYPT_WORK_FACTOR
+    block_size = settings.PASSWORD_SCRYPT_BLOCK_SIZE
+    parallelism = settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class PBKDF2PasswordHasher(BoundedHasherMixin, hashers.PBKDF2PasswordHasher):
+    """Verifies the PBKDF2 hashes stored before the switch to Argon2."""
@@ -0,0 +1,194 @@
+import codecs
+import csv
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import availability, caching, search
+from .models import Farm, Farmer, FarmProduct, Product, ProductOffer
+
+FORMATS = ('csv', 'ndjson')
+
+
+# ``foreign_keys`` maps a column to the model it refers to by external_id.
+ImportSpec = namedtuple('ImportSpec', ['model', 'fields', 'foreign_keys'], defaults=[{}])
+
+
+# In dependency order: every kind only refers to kinds listed before it.
+SPECS = {
+    'farmers': ImportSpec(Farmer, ('name', 'description')),
+    'farms': ImportSpec(Farm, ('name', 'description', 'location'), {'farmer': Farmer}),
+    'products': ImportSpec(Product, ('name', 'description', 'type')),
+    'farm_products': ImportSpec(FarmProduct, ('quantity', 'price', 'label'), {'farm': Farm, 'product': Product}),
+}
+REFERENCED_MODELS = {target for spec in SPECS.values() for target in spec.foreign_keys.values()}
+
+
+def detect_format(filename):
+    return 'ndjson' if filename.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def is_utf8(chunks):
+    """Whether the byte strings of ``chunks`` together decode as UTF-8."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in chunks:
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def read_rows(lines, file_format):
+    """Yield ``(row_number, row)`` from an iterable of text lines."""
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Each line must be a JSON object.')
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+
+class CatalogImporter:
+    """Upsert catalog rows keyed by ``external_id`` in batches.
+
+    Foreign keys are given as the external_id of the referenced row and are
+    resolved through in-memory maps that grow as referenced kinds are
+    imported, so no row costs a query of its own. Rows that fail validation
+    are reported and skipped; the rest of their batch is still written.
+    Blank cells leave the current value of an existing row alone.
+    """
+
+    def __init__(self, batch_size=2000, max_errors=1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self._keys = {}
+
+    def keys(self, model):
+        if model not in self._keys:
+            self._keys[model] = dict(
+                model.objects.exclude(external_id=None).values_list('external_id', 'pk').iterator(chunk_size=5000)
+            )
+        return self._keys[model]
+
+    def run(self, kind, rows):
+        spec = SPECS[kind]
+        report = ImportReport(self.max_errors)
+        batch, blanks = {}, {}
+        for number, row in rows:
+            obj = self.build(spec, number, row, report)
+            if obj is None:
+                continue
+            # A key repeated within a batch keeps its last row, the upsert
+            # could not touch the same row twice in one statement.
+            batch[obj.external_id] = obj
+            blanks[obj.external_id] = [name for name in spec.fields if row.get(name) in (None, '')]
+            if len(batch) >= self.batch_size:
+                self.flush(kind, spec, batch, blanks, report)
+                batch, blanks = {}, {}
+        self.flush(kind, spec, batch, blanks, report)
+        caching.bump_version(spec.model)
+        return report
+
+    def build(self, spec, number, row, report):
+        if isinstance(row, Exception):
+            report.error(number, {'row': [str(row)]})
+            return None
+        external_id = str(row.get('external_id') or '').strip()
+        if not external_id:
+            report.error(number, {'external_id': ['This field is required.']})
+            return None
+
+        values = {name: row.get(name) for name in spec.fields if row.get(name) not in (None, '')}
+        errors = {}
+        for column, target in spec.foreign_keys.items():
+            pk = self.keys(target).get(str(row.get(column) or '').strip())
+            if pk is None:
+                errors[column] = [f'Unknown {target.__name__} external_id: {row.get(column)!r}.']
+            values[f'{column}_id'] = pk
+
+        obj = spec.model(external_id=external_id, **values)
+        try:
+            obj.clean_fields(exclude=list(spec.foreign_keys))
+        except ValidationError as exc:
+            errors.update(exc.message_dict)
+        if errors:
+            report.error(number, errors)
+            return None
+        return obj
+
+    def flush(self, kind, spec, batch, blanks, report):
+        if not batch:
+            return
+        model = spec.model
+        with transaction.atomic():
+            # One statement updates the same columns of every row, so the
+            # blank cells of existing rows are filled with what they hold.
+            current = model.objects.select_for_update().filter(external_id__in=batch).values('external_id', *spec.fields)
+            existing = set()
+            for row in current:
+                existing.add(row['external_id'])
+                obj = batch[row['external_id']]
+                for name in blanks[row['external_id']]:
+                    setattr(obj, name, row[name])
+            model.objects.bulk_create(
+                batch.values(), update_conflicts=True, unique_fields=['external_id'],
+                update_fields=[*spec.fields, *spec.foreign_keys, 'updated_at'],
+            )
+            self.reindex(kind, batch, existing)
+        report.updated += len(existing)
+        report.created += len(batch) - len(existing)
+
+        if model in REFERENCED_MODELS:
+            self.keys(model).update(
+                model.objects.filter(external_id__in=batch).values_list('external_id', 'pk')
+            )
+
+    def reindex(self, kind, batch, existing):
+        # bulk_create skips the post_save handlers that keep the search
+        # index and best offers current, so refresh them here.
+        if kind == 'farm_products':
+            search.index_queryset(FarmProduct.objects.filter(external_id__in=batch))
+            # Updated rows may have been the best offer of another product.
+            previous = ProductOffer.objects.filter(farm_product__external_id__in=existing).values_list('product_id', flat=True)
+            availability.refresh({obj.product_id for obj in batch.values()} | set(previous))
+        elif kind == 'farms' and existing:
+            search.index_queryset(FarmProduct.objects.filter(farm__external_id__in=existing))
+        elif kind == 'products' and existing:
+            search.index_queryset(FarmProduct.objects.filter(product__external_id__in=existing))
+
+
+def import_files(files, batch_size=2000, max_errors=1000):
+    """Import ``{kind: (lines, file_format)}`` in dependency order."""
+    importer = CatalogImporter(batch_size=batch_size, max_errors=max_errors)
+    return {
+        kind: importer.run(kind, read_rows(*files[kind])).as_dict()
+        for kind in SPECS if kind in files
+    }
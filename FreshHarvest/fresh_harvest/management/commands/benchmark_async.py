@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the sync and async read endpoints under concurrent clients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--cold', action='store_true', help='Clear the response cache before every request.')
+
+    def handle(self, *args, **options):
+        results = benchmark.run_concurrent(
+            concurrency=options['concurrency'], total=options['requests'], cold=options['cold'],
+        )
+        self.stdout.write(f"{'endpoint':<22}{'mode':<7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}  status")
+        for name, modes in results.items():
+            for mode, row in modes.items():
+                self.stdout.write(
+                    f"{name:<22}{mode:<7}{row['requests_per_second']:>10.1f}"
+                    f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}  {row['statuses']}"
+                )
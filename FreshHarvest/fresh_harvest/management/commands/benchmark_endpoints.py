@@ -0,0 +1,54 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from fresh_harvest import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure latency percentiles and query counts of the API endpoints against a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cold', action='store_true', help='Clear the response cache before every request.')
+        parser.add_argument('--anonymous', action='store_true', help='Skip the endpoints that need a user.')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmark_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=1.25,
+                            help='Allowed p95 slowdown factor before an endpoint counts as a regression.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1; percentiles need timings.')
+        user = None if options['anonymous'] else benchmark.pick_user()
+        results = benchmark.run(
+            iterations=options['iterations'], warmup=options['warmup'], cold=options['cold'], user=user,
+        )
+        self.stdout.write(f"{'endpoint':<28}{'status':>7}{'queries':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<28}{row['status']:>7}{row['queries']:>9}"
+                f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+            )
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        try:
+            baseline = benchmark.load_baseline(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --save-baseline to create one.")
+            return
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"Baseline {options['baseline']} is not valid JSON: {exc}")
+
+        regressions = benchmark.compare(results, baseline, tolerance=options['tolerance'])
+        for line in regressions:
+            self.stderr.write(line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against the baseline.')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
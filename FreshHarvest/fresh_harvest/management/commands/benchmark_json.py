@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure JSON rendering and parsing throughput on catalog, cart and order payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        results = benchmark.run_json(iterations=options['iterations'])
+        self.stdout.write(f"{'payload':<16}{'backend':<9}{'bytes':>10}{'render MB/s':>13}{'parse MB/s':>12}")
+        for name, backends in results.items():
+            for backend, row in backends.items():
+                self.stdout.write(
+                    f"{name:<16}{backend:<9}{row['bytes']:>10}"
+                    f"{row['render_bytes_per_second'] / 1e6:>13.1f}{row['parse_bytes_per_second'] / 1e6:>12.1f}"
+                )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fresh_harvest import query_plans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot catalog, cart and order queries and fail if any does a full scan.'
+
+    def handle(self, *args, **options):
+        problems = query_plans.check_hot_queries()
+        for name, scans in problems.items():
+            self.stderr.write(f'{name}:')
+            for line in scans:
+                self.stderr.write(f'    {line}')
+        if problems:
+            raise CommandError(f'{len(problems)} hot queries fall back to a full scan.')
+        self.stdout.write(self.style.SUCCESS(f'All {len(query_plans.hot_queries())} hot queries use an index.'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import reservations
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cart stock holds, once or every --interval seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between sweeps; 0 sweeps once and exits.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Holds deleted per statement.')
+
+    def handle(self, *args, **options):
+        while True:
+            count = reservations.expire(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Expired {count} holds.'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from fresh_harvest import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream the farm product catalog or the order history as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['catalog', 'orders'])
+        parser.add_argument('--format', dest='output_format', choices=exports.FORMATS, default='ndjson')
+        parser.add_argument('--since', help='Only export rows changed after this ISO 8601 watermark.')
+        parser.add_argument('--output', help='File to write to instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = exports.parse_watermark(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since watermark: {options['since']}")
+
+        until = timezone.now()
+        lines = exports.stream(options['kind'], options['output_format'], since, until, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as fh:
+                fh.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        # The next incremental run passes this back as --since.
+        self.stderr.write(f'Watermark: {until.isoformat()}')
@@ -0,0 +1,245 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from fresh_harvest import availability, ratings, search
+from fresh_harvest.models import (
+    User, Product, Farmer, Farm, FarmProduct, Review, Discount, Order, OrderItem, Recipe
+)
+
+FIRST_NAMES = ['Asha', 'Bikash', 'Chandra', 'Deepa', 'Gita', 'Hari', 'Kamal', 'Laxmi', 'Maya', 'Nabin',
+               'Pooja', 'Ram', 'Sita', 'Suman', 'Tara', 'Umesh']
+LAST_NAMES = ['Adhikari', 'Bhandari', 'Gurung', 'Karki', 'Magar', 'Rai', 'Shrestha', 'Tamang', 'Thapa']
+PLACES = ['Kathmandu', 'Pokhara', 'Chitwan', 'Dhulikhel', 'Ilam', 'Jumla', 'Mustang', 'Palpa', 'Dharan']
+FARM_WORDS = ['Green', 'Valley', 'Hill', 'River', 'Sunrise', 'Terrace', 'Meadow', 'Orchard', 'Spring']
+PRODUCT_TYPES = {
+    'fruit': ['Apple', 'Banana', 'Mango', 'Orange', 'Pear', 'Plum', 'Kiwi', 'Papaya', 'Guava', 'Lemon'],
+    'vegetable': ['Tomato', 'Potato', 'Onion', 'Cabbage', 'Carrot', 'Spinach', 'Cauliflower', 'Radish'],
+    'herb': ['Coriander', 'Mint', 'Basil', 'Fenugreek', 'Garlic', 'Ginger'],
+    'grain': ['Rice', 'Millet', 'Buckwheat', 'Maize', 'Barley'],
+}
+VARIETIES = ['Organic', 'Heirloom', 'Local', 'Baby', 'Red', 'Golden', 'Wild', 'Mountain']
+REVIEW_LINES = ['Very fresh', 'Tasted great', 'Arrived bruised', 'Good value', 'Would buy again',
+                'Smaller than expected', 'Excellent quality', 'Just okay']
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic catalog, review and order data in bulk for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--farmers', type=int, default=100)
+        parser.add_argument('--farms-per-farmer', type=int, default=2)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--farm-products', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--max-order-items', type=int, default=5)
+        parser.add_argument('--recipes', type=int, default=50)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Do not rebuild the search index, rating aggregates and best offers afterwards.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        # Tag generated rows so repeated runs never collide on unique fields.
+        self.run_tag = f'{timezone.now():%Y%m%d%H%M%S}'
+
+        user_ids = self.create_users(options['users'])
+        farmer_ids = self.create_farmers(options['farmers'])
+        farm_ids = self.create_farms(farmer_ids, options['farms_per_farmer'])
+        product_ids = self.create_products(options['products'])
+        farm_product_ids = self.create_farm_products(farm_ids, product_ids, options['farm_products'])
+        self.create_reviews(user_ids, farm_product_ids, options['reviews'])
+        self.create_orders(user_ids, farm_product_ids, options['orders'], options['max_order_items'])
+        self.create_recipes(product_ids, options['recipes'])
+        self.create_discounts()
+
+        if not options['skip_derived']:
+            self.log('Rebuilding search index')
+            search.rebuild_index(chunk_size=self.chunk_size)
+            self.log('Recomputing rating aggregates')
+            ratings.recompute_all(batch_size=self.chunk_size)
+            self.log('Rebuilding best offers')
+            availability.rebuild()
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated.'))
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def bulk_insert(self, model, rows, total):
+        """Insert ``total`` rows from the ``rows`` generator in chunks and return their ids."""
+        ids = []
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                ids.extend(self.flush(model, chunk))
+                chunk = []
+                self.log(f'  {model.__name__}: {len(ids)}/{total}')
+        ids.extend(self.flush(model, chunk))
+        return ids
+
+    def flush(self, model, chunk):
+        if not chunk:
+            return []
+        with transaction.atomic():
+            return [obj.pk for obj in model.objects.bulk_create(chunk)]
+
+    def past(self, days):
+        return timezone.now() - timedelta(days=self.random.uniform(0, days))
+
+    def person_name(self):
+        return f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}'
+
+    def create_users(self, total):
+        self.log(f'Creating {total} users')
+        password = make_password('password')
+        rows = (
+            User(
+                username=f'user-{self.run_tag}-{i}',
+                email_or_phone=f'user-{self.run_tag}-{i}@example.com',
+                name=self.person_name(),
+                location=self.random.choice(PLACES),
+                password=password,
+                created_at=self.past(730),
+            )
+            for i in range(total)
+        )
+        return self.bulk_insert(User, rows, total)
+
+    def create_farmers(self, total):
+        self.log(f'Creating {total} farmers')
+        rows = (
+            Farmer(name=self.person_name(), description='Family farmer', created_at=self.past(730))
+            for _ in range(total)
+        )
+        return self.bulk_insert(Farmer, rows, total)
+
+    def create_farms(self, farmer_ids, per_farmer):
+        total = len(farmer_ids) * per_farmer
+        self.log(f'Creating {total} farms')
+        rows = (
+            Farm(
+                farmer_id=farmer_id,
+                name=f'{self.random.choice(FARM_WORDS)} {self.random.choice(FARM_WORDS)} Farm',
+                description='Smallholding',
+                location=self.random.choice(PLACES),
+                created_at=self.past(730),
+            )
+            for farmer_id in farmer_ids
+            for _ in range(per_farmer)
+        )
+        return self.bulk_insert(Farm, rows, total)
+
+    def create_products(self, total):
+        self.log(f'Creating {total} products')
+
+        def rows():
+            for _ in range(total):
+                product_type = self.random.choice(list(PRODUCT_TYPES))
+                name = f'{self.random.choice(VARIETIES)} {self.random.choice(PRODUCT_TYPES[product_type])}'
+                yield Product(name=name, description=f'{name} grown in the hills', type=product_type,
+                              created_at=self.past(730))
+        return self.bulk_insert(Product, rows(), total)
+
+    def create_farm_products(self, farm_ids, product_ids, total):
+        self.log(f'Creating {total} farm products')
+        rows = (
+            FarmProduct(
+                farm_id=self.random.choice(farm_ids),
+                product_id=self.random.choice(product_ids),
+                quantity=self.random.randint(0, 500),
+                price=Decimal(self.random.randint(20, 5000)) / 100,
+                label=self.random.choice([None, 'Organic', 'Fresh', 'Sale']),
+                created_at=self.past(365),
+            )
+            for _ in range(total)
+        )
+        return self.bulk_insert(FarmProduct, rows, total)
+
+    def create_reviews(self, user_ids, farm_product_ids, total):
+        self.log(f'Creating {total} reviews')
+        rows = (
+            Review(
+                user_id=self.random.choice(user_ids),
+                farm_product_id=self.random.choice(farm_product_ids),
+                rating=self.random.choices(range(1, 6), weights=[1, 1, 3, 6, 9])[0],
+                description=self.random.choice(REVIEW_LINES),
+                likes=self.random.randint(0, 50),
+                dislikes=self.random.randint(0, 10),
+                created_at=self.past(365),
+            )
+            for _ in range(total)
+        )
+        self.bulk_insert(Review, rows, total)
+
+    def create_orders(self, user_ids, farm_product_ids, total, max_items):
+        self.log(f'Creating {total} orders')
+        catalog = {
+            pk: (price, product_name, farm_name)
+            for pk, price, product_name, farm_name in FarmProduct.objects.values_list(
+                'pk', 'price', 'product__name', 'farm__name'
+            ).iterator()
+        }
+        created = 0
+        while created < total:
+            size = min(self.chunk_size, total - created)
+            lines = [self.order_lines(farm_product_ids, max_items) for _ in range(size)]
+            orders = [
+                Order(
+                    user_id=self.random.choice(user_ids),
+                    total_bill=sum(catalog[farm_product_id][0] * quantity for farm_product_id, quantity in items.items()),
+                    status=self.random.choice(ORDER_STATUSES),
+                    created_at=self.past(365),
+                )
+                for items in lines
+            ]
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                # ordered_at is auto_now_add, so spread it over the past year afterwards.
+                Order.objects.filter(pk__in=[order.pk for order in orders]).update(ordered_at=F('created_at'))
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order_id=order.pk, farm_product_id=farm_product_id, quantity=quantity,
+                        unit_price=catalog[farm_product_id][0], product_name=catalog[farm_product_id][1],
+                        farm_name=catalog[farm_product_id][2],
+                    )
+                    for order, items in zip(orders, lines)
+                    for farm_product_id, quantity in items.items()
+                ], batch_size=self.chunk_size)
+            created += size
+            self.log(f'  Order: {created}/{total}')
+
+    def order_lines(self, farm_product_ids, max_items):
+        count = min(self.random.randint(1, max_items), len(farm_product_ids))
+        return {farm_product_id: self.random.randint(1, 5) for farm_product_id in self.random.sample(farm_product_ids, count)}
+
+    def create_recipes(self, product_ids, total):
+        self.log(f'Creating {total} recipes')
+        recipe_ids = self.bulk_insert(
+            Recipe, (Recipe(name=f'Recipe {self.run_tag}-{i}') for i in range(total)), total
+        )
+        Through = Recipe.products.through
+        Through.objects.bulk_create([
+            Through(recipe_id=recipe_id, product_id=product_id)
+            for recipe_id in recipe_ids
+            for product_id in self.random.sample(product_ids, min(6, len(product_ids)))
+        ], batch_size=self.chunk_size)
+
+    def create_discounts(self):
+        Discount.objects.bulk_create([
+            Discount(coupon_code=f'SAVE{percent}', discount_percent=Decimal(percent))
+            for percent in (5, 10, 20)
+        ], ignore_conflicts=True)
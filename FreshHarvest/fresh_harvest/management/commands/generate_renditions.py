@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import renditions
+
+
+class Command(BaseCommand):
+    help = 'Render the resized copies of product and user images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Render every image again, even if it is current.')
+        parser.add_argument('--workers', type=int, default=4, help='Images rendered in parallel.')
+
+    def handle(self, *args, **options):
+        sources = renditions.pending_sources(force=options['force'])
+        rendered = skipped = 0
+        # Pillow releases the GIL while decoding and resizing, so threads
+        # render in parallel; the rows are updated from this thread only.
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for source, meta in zip(sources, pool.map(renditions.try_render, sources)):
+                if meta is None:
+                    skipped += 1
+                    continue
+                renditions.store(source, meta)
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} images, skipped {skipped} missing or unreadable.'))
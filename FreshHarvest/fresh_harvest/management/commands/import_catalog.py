@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fresh_harvest import imports
+
+
+class Command(BaseCommand):
+    help = 'Upsert farmers, farms, products and farm products from CSV or NDJSON files.'
+
+    def add_arguments(self, parser):
+        for kind in imports.SPECS:
+            parser.add_argument(f"--{kind.replace('_', '-')}", dest=kind, metavar='PATH')
+        parser.add_argument('--format', dest='file_format', choices=imports.FORMATS,
+                            help='File format; guessed from each file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--max-errors', type=int, default=1000, help='Row errors to list per kind.')
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in imports.SPECS if options[kind]}
+        if not paths:
+            raise CommandError('Give at least one file, e.g. --farm-products products.csv')
+
+        handles = {kind: open(path, newline='', encoding='utf-8-sig') for kind, path in paths.items()}
+        try:
+            files = {
+                kind: (fh, options['file_format'] or imports.detect_format(paths[kind]))
+                for kind, fh in handles.items()
+            }
+            report = imports.import_files(files, batch_size=options['batch_size'], max_errors=options['max_errors'])
+        finally:
+            for fh in handles.values():
+                fh.close()
+
+        for kind, result in report.items():
+            style = self.style.SUCCESS if not result['failed'] else self.style.WARNING
+            self.stdout.write(style(
+                f"{kind}: {result['created']} created, {result['updated']} updated, {result['failed']} failed"
+            ))
+            for error in result['errors']:
+                self.stderr.write(f"  row {error['row']}: {json.dumps(error['errors'])}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Worker processes; 0 runs the tasks in this process.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due instead of polling.')
+
+    def handle(self, *args, **options):
+        count = tasks.work(options['processes'], options['poll_interval'], options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {count} tasks.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import search
+from fresh_harvest.models import SearchToken
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the farm product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {SearchToken.objects.count()} search tokens.'))
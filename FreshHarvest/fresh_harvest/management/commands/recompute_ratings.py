@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fresh_harvest import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating aggregates of every farm product from its reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = ratings.recompute_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {total} farm products.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the replica database, once or every --interval seconds, '
+            'to stand in for replication locally.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Alias of the replica database.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between copies; 0 copies once and exits.')
+
+    def handle(self, *args, **options):
+        source, target = connections[DEFAULT_DB_ALIAS], connections[options['database']]
+        if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases are copied; real replicas are kept in sync by the server.')
+        names = source.settings_dict['NAME'], target.settings_dict['NAME']
+        if names[0] == names[1]:
+            raise CommandError('The replica is the primary database itself.')
+        while True:
+            source.ensure_connection()
+            target.ensure_connection()
+            # The backup API copies a consistent snapshot while writers go on.
+            source.connection.backup(target.connection)
+            self.stdout.write(self.style.SUCCESS('Copied %s to %s.' % names))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
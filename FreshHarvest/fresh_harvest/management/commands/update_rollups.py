@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from fresh_harvest import analytics
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders into the daily sales rollups, or rebuild them with --backfill.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='Rebuild the rollups instead of extending them.')
+        parser.add_argument('--since', help='With --backfill, only rebuild from this date (YYYY-MM-DD).')
+        parser.add_argument('--days-per-batch', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not options['backfill']:
+            touched = analytics.update_rollups(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Updated {touched} daily sales rows.'))
+            return
+
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+        touched = analytics.backfill(
+            since=since, days_per_batch=options['days_per_batch'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {touched} daily sales rows.'))
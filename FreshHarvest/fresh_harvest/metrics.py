@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+IN_LIST_RE = re.compile(r'\((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+current_record = ContextVar('request_metrics_record', default=None)
+
+
+def fingerprint(sql):
+    """Normalise SQL so the same statement with other values compares equal."""
+    return NUMBER_RE.sub('?', IN_LIST_RE.sub('(...)', sql))
+
+
+class RequestRecord:
+    """Queries and timings collected while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_ms = 0.0
+        self.serialize_ms = 0.0
+        self.fingerprints = Counter()
+        self._serialize_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.query_count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper that counts queries towards the request being sampled, if any.
+
+    It sits on every connection rather than being installed per request,
+    because async views run their queries in sync_to_async threads, each
+    with its own connection; the ``current_record`` context follows them.
+    """
+    record = current_record.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    return record(execute, sql, params, many, context)
+
+
+def install_query_recording(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class MetricsRegistry:
+    """Rolling window of request samples per view, kept in process memory."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._duplicates = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, view, record, total_ms):
+        sample = (total_ms, record.sql_ms, record.serialize_ms, record.query_count)
+        with self._lock:
+            self._samples[view].append(sample)
+            self._duplicates[view].update(record.duplicates)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._duplicates.clear()
+
+    def snapshot(self, top_duplicates=5):
+        with self._lock:
+            samples = {view: list(rows) for view, rows in self._samples.items()}
+            duplicates = {view: counter.most_common(top_duplicates) for view, counter in self._duplicates.items()}
+
+        report = {}
+        for view, rows in samples.items():
+            totals = [row[0] for row in rows]
+            buckets = Counter()
+            for total in totals:
+                bucket = next((f'le_{bound}' for bound in LATENCY_BUCKETS_MS if total <= bound), 'le_inf')
+                buckets[bucket] += 1
+            report[view] = {
+                'samples': len(rows),
+                'latency_ms': {
+                    'p50': _percentile(totals, 0.50),
+                    'p95': _percentile(totals, 0.95),
+                    'p99': _percentile(totals, 0.99),
+                },
+                'histogram': {
+                    **{f'le_{bound}': buckets[f'le_{bound}'] for bound in LATENCY_BUCKETS_MS},
+                    'le_inf': buckets['le_inf'],
+                },
+                'avg_sql_ms': sum(row[1] for row in rows) / len(rows),
+                'avg_serialize_ms': sum(row[2] for row in rows) / len(rows),
+                'avg_queries': sum(row[3] for row in rows) / len(rows),
+                'max_queries': max(row[3] for row in rows),
+                'duplicate_queries': [{'sql': sql, 'count': count} for sql, count in duplicates.get(view, [])],
+            }
+        return report
+
+
+registry = MetricsRegistry()
+
+
+class TimedRepresentationMixin:
+    """Add the time spent in to_representation to the sampled request's record."""
+
+    def to_representation(self, instance):
+        record = current_record.get()
+        if record is None:
+            return super().to_representation(instance)
+        # Nested serializers run inside their parent's, count them once.
+        record._serialize_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record._serialize_depth -= 1
+            if record._serialize_depth == 0:
+                record.serialize_ms += (time.perf_counter() - start) * 1000
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(cls):
+    """A subclass of the serializer ``cls`` that reports its serialization time."""
+    if cls not in _timed_classes:
+        _timed_classes[cls] = type(cls.__name__, (TimedRepresentationMixin, cls), {'__module__': cls.__module__})
+    return _timed_classes[cls]
+
+
+class SerializerTimingMixin:
+    """Time the view's serializers for the serialize entry of request metrics."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
@@ -0,0 +1,83 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return match.view_name or getattr(view, '__name__', 'view')
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class QueryMetricsMiddleware:
+    """Record query count, SQL time, duplicate queries and serializer time.
+
+    A share of requests set by ``REQUEST_METRICS_SAMPLE_RATE`` get a record
+    that the query hook of every connection (metrics.record_query) and the
+    views' SerializerTimingMixin add to; those report their numbers in a
+    ``Server-Timing`` header and feed the rolling per-view histograms served
+    by the metrics endpoint.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        metrics.registry.window = settings.REQUEST_METRICS_WINDOW
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        record = metrics.RequestRecord()
+        token = metrics.current_record.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_record.reset(token)
+        return self.finish(request, response, record)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        record = metrics.RequestRecord()
+        token = metrics.current_record.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_record.reset(token)
+        return self.finish(request, response, record)
+
+    def sampled(self):
+        sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        return sample_rate > 0 and random.random() < sample_rate
+
+    def finish(self, request, response, record):
+        total_ms = record.total_ms
+        duplicates = sum(count - 1 for count in record.duplicates.values())
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={record.sql_ms:.2f};desc="{record.query_count} queries, {duplicates} duplicates"',
+            f'serialize;dur={record.serialize_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+        name = view_name(request)
+        if name is not None:
+            metrics.registry.record(name, record, total_ms)
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from fresh_harvest.search import document_tokens
+
+
+def populate_search_index(apps, schema_editor):
+    FarmProduct = apps.get_model('fresh_harvest', 'FarmProduct')
+    SearchTerm = apps.get_model('fresh_harvest', 'SearchTerm')
+    SearchToken = apps.get_model('fresh_harvest', 'SearchToken')
+    tokens = []
+    terms = set()
+    for farm_product in FarmProduct.objects.select_related('farm', 'product').order_by('pk').iterator(chunk_size=2000):
+        for token, weight in document_tokens(farm_product).items():
+            tokens.append(SearchToken(farm_product_id=farm_product.pk, token=token, weight=weight))
+            terms.add(token)
+    SearchTerm.objects.bulk_create([SearchTerm(term=term, length=len(term)) for term in terms], batch_size=1000)
+    SearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0003_user_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, unique=True)),
+                ('length', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['length', 'term'], name='fresh_harve_length_0ffca8_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('farm_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='fresh_harvest.farmproduct')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'farm_product'], name='fresh_harve_token_1c685b_idx')],
+                'unique_together': {('farm_product', 'token')},
+            },
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
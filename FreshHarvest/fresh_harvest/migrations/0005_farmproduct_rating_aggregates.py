@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    FarmProduct = apps.get_model('fresh_harvest', 'FarmProduct')
+    Review = apps.get_model('fresh_harvest', 'Review')
+    histograms = defaultdict(dict)
+    rows = Review.objects.filter(rating__range=(1, 5)).values('farm_product_id', 'rating').annotate(total=Count('id')).order_by()
+    for row in rows:
+        histograms[row['farm_product_id']][row['rating']] = row['total']
+    farm_products = []
+    for farm_product_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        average = Decimal(sum(star * total for star, total in histogram.items())) / count
+        farm_products.append(FarmProduct(
+            pk=farm_product_id,
+            rating_count=count,
+            rating_avg=average.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            **{f'rating_{star}_count': histogram.get(star, 0) for star in range(1, 6)},
+        ))
+    fields = ['rating_avg', 'rating_count'] + [f'rating_{star}_count' for star in range(1, 6)]
+    FarmProduct.objects.bulk_update(farm_products, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='farmproduct',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(fields=['rating_avg', 'rating_count'], name='fresh_harve_rating__7f57de_idx'),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0005_farmproduct_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmer',
+            index=models.Index(fields=['name'], name='fresh_harve_name_8182a5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(fields=['created_at', 'id'], name='fresh_harve_created_c7d186_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(fields=['price'], name='fresh_harve_price_d35691_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(fields=['harvest_date'], name='fresh_harve_harvest_958ba1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['product', 'price'], name='farmproduct_in_stock_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'ordered_at'], name='fresh_harve_user_id_211625_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', 'ordered_at'], name='fresh_harve_user_id_0e4ccd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='fresh_harve_name_a7f126_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['type'], name='fresh_harve_type_2ef1d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['farm_product', 'created_at', 'id'], name='fresh_harve_farm_pr_b229cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['farm_product', 'date'], name='fresh_harve_farm_pr_b18768_idx'),
+        ),
+    ]
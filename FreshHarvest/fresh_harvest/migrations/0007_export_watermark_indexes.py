@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmproduct',
+            index=models.Index(fields=['updated_at', 'id'], name='fresh_harve_updated_080ee3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at', 'id'], name='fresh_harve_updated_9c7458_idx'),
+        ),
+    ]
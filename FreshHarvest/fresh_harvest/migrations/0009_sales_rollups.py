@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0008_import_external_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['ordered_at'], name='fresh_harve_ordered_c95ca2_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='fresh_harvest.farm'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='farm_product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='fresh_harvest.farmproduct'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='fresh_harvest.product'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysales',
+            index=models.Index(fields=['farm', 'day'], name='fresh_harve_farm_id_bff90e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysales',
+            index=models.Index(fields=['product', 'day'], name='fresh_harve_product_792d13_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysales',
+            unique_together={('day', 'farm_product')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_product_offers(apps, schema_editor):
+    FarmProduct = apps.get_model('fresh_harvest', 'FarmProduct')
+    ProductOffer = apps.get_model('fresh_harvest', 'ProductOffer')
+    offers = {}
+    in_stock = FarmProduct.objects.filter(quantity__gt=0).order_by('product_id', 'price', 'id')
+    for farm_product in in_stock.only('product_id', 'price', 'quantity').iterator(chunk_size=2000):
+        if farm_product.product_id not in offers:
+            offers[farm_product.product_id] = ProductOffer(
+                product_id=farm_product.product_id, farm_product_id=farm_product.pk,
+                price=farm_product.price, quantity=farm_product.quantity,
+            )
+    ProductOffer.objects.bulk_create(offers.values(), batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductOffer',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='best_offer', serialize=False, to='fresh_harvest.product')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farm_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='fresh_harvest.farmproduct')),
+            ],
+        ),
+        migrations.RunPython(populate_product_offers, migrations.RunPython.noop),
+    ]
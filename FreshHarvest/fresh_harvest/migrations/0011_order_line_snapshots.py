@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def snapshot_order_lines(apps, schema_editor):
+    # Lines placed before snapshots existed get today's catalog values, the
+    # closest record left of what was paid.
+    OrderItem = apps.get_model('fresh_harvest', 'OrderItem')
+    lines = OrderItem.objects.select_related('farm_product__product', 'farm_product__farm').order_by('pk')
+    batch = []
+    for line in lines.iterator(chunk_size=2000):
+        line.unit_price = line.farm_product.price
+        line.product_name = line.farm_product.product.name
+        line.farm_name = line.farm_product.farm.name
+        batch.append(line)
+        if len(batch) >= 2000:
+            OrderItem.objects.bulk_update(batch, ['unit_price', 'product_name', 'farm_name'])
+            batch = []
+    OrderItem.objects.bulk_update(batch, ['unit_price', 'product_name', 'farm_name'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0010_product_offers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='fresh_harve_user_id_211625_idx',
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='farm_name',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'ordered_at', 'id'], name='fresh_harve_user_id_7d521f_idx'),
+        ),
+        migrations.RunPython(snapshot_order_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fresh_harvest', '0013_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cart_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hold', serialize=False, to='fresh_harvest.cartitem')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('farm_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='fresh_harvest.farmproduct')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['farm_product', 'expires_at', 'quantity'], name='fresh_harve_farm_pr_d05ceb_idx'), models.Index(fields=['expires_at'], name='fresh_harve_expires_55c508_idx')],
+            },
+        ),
+    ]
@@ -26,6 +26,7 @@ class User(AbstractUser, TimeStampedModel):
         null=True,
         default='user_images/default.png'
     )
+    image_renditions = models.JSONField(default=dict, blank=True)
 
     USERNAME_FIELD = 'email_or_phone'
     REQUIRED_FIELDS = ['username', 'name']
@@ -43,6 +44,13 @@ class Product(TimeStampedModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     type = models.CharField(max_length=20)
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name']),
+            models.Index(fields=['type']),
+        ]
 
     def __str__(self):
         return self.name
@@ -51,6 +59,10 @@ class Product(TimeStampedModel):
 class Farmer(TimeStampedModel):
     name = models.CharField(max_length=50)
     description = models.TextField()
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['name'])]
 
     def __str__(self):
         return self.name
@@ -61,6 +73,7 @@ class Farm(TimeStampedModel):
     name = models.CharField(max_length=50)
     description = models.TextField()
     location = models.CharField(max_length=200)
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -73,14 +86,54 @@ class FarmProduct(TimeStampedModel):
     price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     label = models.CharField(max_length=50, null=True, blank=True)
     harvest_date = models.DateField(auto_now=True)
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.00'))
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['price']),
+            models.Index(fields=['harvest_date']),
+            models.Index(fields=['rating_avg', 'rating_count']),
+            models.Index(
+                fields=['product', 'price'],
+                condition=models.Q(quantity__gt=0),
+                name='farmproduct_in_stock_price_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.farm.name} {self.product.name}"
 
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+
+
+class ProductOffer(models.Model):
+    """Cheapest in-stock farm product of a product, kept current by availability.refresh."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='best_offer')
+    farm_product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE, related_name='+')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.farm_product_id} @ {self.price}"
 
 class ProductImage(TimeStampedModel):
     product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE, related_name='images')
     image = models.FileField(null=True, blank=True)
+    # Metadata of the resized copies of ``image``, see renditions.py.
+    renditions = models.JSONField(default=dict, blank=True)
 
 
 class Cart(TimeStampedModel):
@@ -115,6 +168,12 @@ class Review(TimeStampedModel):
     dislikes = models.PositiveIntegerField(default=0)
     date = models.DateField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm_product', 'created_at', 'id']),
+            models.Index(fields=['farm_product', 'date']),
+        ]
+
     def __str__(self):
         return f"{self.user.name if self.user else 'Anonymous'} rating: {self.rating}"
 
@@ -134,6 +193,14 @@ class Order(TimeStampedModel):
     status = models.CharField(max_length=30)
     coupon = models.ForeignKey(Discount, blank=True, null=True, on_delete=models.SET_NULL)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'ordered_at', 'id']),
+            models.Index(fields=['user', 'status', 'ordered_at']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['ordered_at']),
+        ]
+
     def __str__(self):
         return self.user.name
 
@@ -142,12 +209,21 @@ class OrderItem(TimeStampedModel):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
     farm_product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    # Copied from the catalog at checkout, so history and totals do not
+    # change when the farm product is edited later.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    product_name = models.CharField(max_length=100, blank=True, default='')
+    farm_name = models.CharField(max_length=50, blank=True, default='')
 
     class Meta:
         unique_together = (('order', 'farm_product'),)
 
     def __str__(self):
-        return f"{self.order.user.name} {self.farm_product.product.name}"
+        return f"{self.order.user.name} {self.product_name}"
+
+    @property
+    def line_total(self):
+        return (self.unit_price * self.quantity).quantize(Decimal('0.01'))
 
 
 class Recipe(TimeStampedModel):
@@ -156,3 +232,107 @@ class Recipe(TimeStampedModel):
 
     def __str__(self):
         return self.name
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=50, unique=True)
+    length = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['length', 'term'])]
+
+    def __str__(self):
+        return self.term
+
+
+class SearchToken(models.Model):
+    farm_product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=50)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = (('farm_product', 'token'),)
+        indexes = [models.Index(fields=['token', 'farm_product'])]
+
+    def __str__(self):
+        return f"{self.token} -> {self.farm_product_id}"
+
+
+class DailySales(models.Model):
+    """Units and revenue of one farm product on one day, filled by analytics.update_rollups."""
+    day = models.DateField()
+    farm_product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE, related_name='daily_sales')
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('day', 'farm_product'),)
+        indexes = [
+            models.Index(fields=['farm', 'day']),
+            models.Index(fields=['product', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.farm_product_id}: {self.revenue}"
+
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
+
+
+class Task(TimeStampedModel):
+    """A unit of background work, run by the ``process_tasks`` worker, see tasks.py."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Higher runs first; tasks of equal priority run in order of run_at.
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id']),
+            models.Index(fields=['status', 'locked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class StockHold(TimeStampedModel):
+    """Stock set aside for a cart line until ``expires_at``, see reservations.py."""
+    cart_item = models.OneToOneField(CartItem, on_delete=models.CASCADE, primary_key=True, related_name='hold')
+    farm_product = models.ForeignKey(FarmProduct, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Covers the sum of a product's active holds without reading rows.
+            models.Index(fields=['farm_product', 'expires_at', 'quantity']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} of {self.farm_product_id} until {self.expires_at}"
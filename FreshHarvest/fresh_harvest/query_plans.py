@@ -0,0 +1,72 @@
+import re
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+
+from .models import DailySales, Order, Farmer, FarmProduct, Product, Review, CartItem, SearchToken, StockHold, Task
+
+# Plan lines that mean a table is read row by row or sorted on the fly.
+FULL_SCAN_PATTERNS = {
+    'sqlite': (
+        re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)(?!.*CONSTANT ROW)'),
+        re.compile(r'\bUSE TEMP B-TREE FOR ORDER BY\b'),
+    ),
+    'postgresql': (
+        re.compile(r'\bSeq Scan\b'),
+    ),
+}
+
+
+def hot_queries():
+    """The queries behind the catalog, cart, order and review hot paths.
+
+    Each entry mirrors a query shape issued by views.py or serializers.py,
+    with representative filter values.
+    """
+    return {
+        'farmers by name': Farmer.objects.order_by('name')[:50],
+        'catalog page': FarmProduct.objects.order_by('-created_at', '-id')[:20],
+        'catalog by rating': FarmProduct.objects.order_by('-rating_avg', '-rating_count')[:20],
+        'catalog by price range': FarmProduct.objects.filter(price__gte=Decimal('1.00'), price__lte=Decimal('2.00')),
+        'catalog by harvest date': FarmProduct.objects.filter(harvest_date__gte=date(2025, 1, 1)).order_by('harvest_date')[:20],
+        'cheapest in-stock offer': FarmProduct.objects.filter(product_id=1, quantity__gt=0).order_by('price')[:1],
+        'product by name': Product.objects.filter(name='Apple'),
+        'products by type': Product.objects.filter(type='fruit'),
+        'reviews of a product': Review.objects.filter(farm_product_id=1).order_by('-created_at', '-id')[:20],
+        'reviews of a product by date': Review.objects.filter(farm_product_id=1, date__gte=date(2025, 1, 1)),
+        'orders of a user': Order.objects.filter(user_id=1).order_by('-ordered_at', '-id')[:20],
+        'orders of a user by status': Order.objects.filter(user_id=1, status='pending').order_by('-ordered_at')[:20],
+        'cart lines of a user': CartItem.objects.filter(cart__user_id=1),
+        'catalog changes since watermark': FarmProduct.objects.filter(updated_at__gt=datetime(2025, 1, 1, tzinfo=timezone.utc)).order_by('updated_at', 'id'),
+        'orders changed since watermark': Order.objects.filter(updated_at__gt=datetime(2025, 1, 1, tzinfo=timezone.utc)).order_by('updated_at', 'id'),
+        'orders placed in a window': Order.objects.filter(ordered_at__gt=datetime(2025, 1, 1, tzinfo=timezone.utc), ordered_at__lte=datetime(2025, 1, 2, tzinfo=timezone.utc)),
+        'sales rollups by farm': DailySales.objects.filter(farm_id=1, day__gte=date(2025, 1, 1)),
+        'search tokens': SearchToken.objects.filter(token__in=['apple', 'tomato']),
+        'due tasks': Task.objects.filter(status='pending', run_at__lte=datetime(2025, 1, 1, tzinfo=timezone.utc)).order_by('-priority', 'run_at', 'id')[:10],
+        'active holds of products': StockHold.objects.filter(farm_product_id__in=[1, 2], expires_at__gt=datetime(2025, 1, 1, tzinfo=timezone.utc)).values('farm_product_id').annotate(total=Sum('quantity')),
+        'expired holds': StockHold.objects.filter(expires_at__lte=datetime(2025, 1, 1, tzinfo=timezone.utc)).values_list('pk', flat=True)[:1000],
+        'expired task leases': Task.objects.filter(status='running', locked_at__lt=datetime(2025, 1, 1, tzinfo=timezone.utc)),
+    }
+
+
+def full_scans(queryset):
+    """Return the plan lines of ``queryset`` that fall back to a full scan."""
+    patterns = FULL_SCAN_PATTERNS.get(connection.vendor)
+    if patterns is None:
+        return []
+    return [
+        line.strip() for line in queryset.explain().splitlines()
+        if any(pattern.search(line) for pattern in patterns)
+    ]
+
+
+def check_hot_queries():
+    """Map each hot query that does a full scan to its offending plan lines."""
+    problems = {}
+    for name, queryset in hot_queries().items():
+        scans = full_scans(queryset)
+        if scans:
+            problems[name] = scans
+    return problems
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from . import caching
+from .models import FarmProduct, Review
+
+STARS = range(1, 6)
+
+
+def _average_expression():
+    weighted = sum(Value(star) * F(f'rating_{star}_count') for star in STARS)
+    return Coalesce(
+        Round(Cast(weighted, FloatField()) / NullIf(F('rating_count'), 0), 2),
+        Value(0.0),
+    )
+
+
+def apply_changes(changes):
+    """Apply ``{farm_product_id: {star: delta}}`` to the stored aggregates.
+
+    Counts move through F() so concurrent reviews cannot clobber each other,
+    and the average is then derived from the updated histogram.
+    """
+    with transaction.atomic():
+        for farm_product_id, deltas in changes.items():
+            deltas = {star: delta for star, delta in deltas.items() if delta and star in STARS}
+            if not deltas:
+                continue
+            queryset = FarmProduct.objects.filter(pk=farm_product_id)
+            queryset.update(
+                updated_at=timezone.now(),
+                rating_count=F('rating_count') + sum(deltas.values()),
+                **{f'rating_{star}_count': F(f'rating_{star}_count') + delta for star, delta in deltas.items()},
+            )
+            queryset.update(rating_avg=_average_expression())
+    caching.bump_version(FarmProduct)
+
+
+def review_changed(old, new):
+    """Record a review moving from ``old`` to ``new``.
+
+    Both are ``(farm_product_id, rating)`` pairs, or ``None`` for a review
+    that is being created or deleted.
+    """
+    changes = defaultdict(lambda: defaultdict(int))
+    if old:
+        changes[old[0]][old[1]] -= 1
+    if new:
+        changes[new[0]][new[1]] += 1
+    apply_changes(changes)
+
+
+def recompute_all(batch_size=1000):
+    """Rebuild every farm product's rating aggregates from the reviews."""
+    histograms = defaultdict(dict)
+    rows = Review.objects.values('farm_product_id', 'rating').annotate(total=Count('id')).order_by()
+    for row in rows.iterator():
+        if row['rating'] in STARS:
+            histograms[row['farm_product_id']][row['rating']] = row['total']
+
+    with transaction.atomic():
+        FarmProduct.objects.update(
+            rating_avg=Decimal('0.00'), rating_count=0,
+            **{f'rating_{star}_count': 0 for star in STARS},
+        )
+        farm_products = []
+        for farm_product_id, histogram in histograms.items():
+            count = sum(histogram.values())
+            average = Decimal(sum(star * total for star, total in histogram.items())) / count
+            farm_product = FarmProduct(
+                pk=farm_product_id,
+                rating_count=count,
+                rating_avg=average.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+                **{f'rating_{star}_count': histogram.get(star, 0) for star in STARS},
+            )
+            farm_products.append(farm_product)
+        fields = ['rating_avg', 'rating_count'] + [f'rating_{star}_count' for star in STARS]
+        FarmProduct.objects.bulk_update(farm_products, fields, batch_size=batch_size)
+    caching.bump_version(FarmProduct)
+    return len(histograms)
@@ -0,0 +1,73 @@
+"""JSON rendering and parsing through orjson, falling back to DRF's stdlib classes.
+
+orjson encodes dicts, lists, strings, numbers, datetimes, dates and UUIDs
+in C. The few other types API data carries, such as Decimal, lazy
+translations and file fields, go through ``JSONEncoder.default``, the same
+conversions DRF's encoder makes, so switching backends does not change a
+response body. Without orjson installed, or when a client asks for indented
+output orjson cannot produce, DRF's stdlib implementation is used.
+"""
+import json
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Error bodies can be keyed by ids.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            return obj.url if obj else None
+        return super().default(obj)
+
+
+_default = JSONEncoder().default
+
+
+def dumps(data):
+    """``data`` as compact UTF-8 JSON."""
+    if orjson is None:
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like DRF, keep the output a strict subset of JavaScript.
+        return dumps(data).replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,154 @@
+"""Resized and recompressed copies of uploaded product and user images.
+
+Every upload is rendered once per entry of ``IMAGE_RENDITIONS`` into a local
+filesystem store, and the metadata of the copies is kept on each row that
+refers to that upload::
+
+    {'source': 'apple.png', 'card': {'name': 'apple/card.webp', 'width': 480, 'height': 320, 'size': 18211}}
+
+``source`` records which upload the copies were made from, so a row whose
+image has been replaced since never serves them.
+"""
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching, tasks
+from .models import ProductImage, Task, User
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+# Each model with renditions and the field their metadata is kept in.
+TARGETS = ((ProductImage, 'renditions'), (User, 'image_renditions'))
+
+
+def get_storage():
+    return FileSystemStorage(location=settings.IMAGE_RENDITION_ROOT, base_url=settings.IMAGE_RENDITION_URL)
+
+
+def rendition_name(source, kind):
+    stem = posixpath.splitext(source)[0]
+    return f'{stem}/{kind}.{EXTENSIONS[settings.IMAGE_RENDITION_FORMAT]}'
+
+
+def is_current(renditions, source):
+    return bool(source) and renditions.get('source') == source
+
+
+def _prepare(image):
+    image = ImageOps.exif_transpose(image)
+    keep_alpha = settings.IMAGE_RENDITION_FORMAT != 'JPEG' and (
+        image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    )
+    mode = 'RGBA' if keep_alpha else 'RGB'
+    return image if image.mode == mode else image.convert(mode)
+
+
+def _encode(image, edge):
+    # thumbnail() only ever shrinks, so a small upload is just recompressed.
+    copy = image.copy()
+    copy.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, settings.IMAGE_RENDITION_FORMAT, quality=settings.IMAGE_RENDITION_QUALITY)
+    return copy.size, buffer.getvalue()
+
+
+def render(source):
+    """Write every rendition of the stored image ``source`` and return their metadata."""
+    with default_storage.open(source, 'rb') as fh:
+        image = Image.open(fh)
+        image.load()
+    image = _prepare(image)
+    storage = get_storage()
+    meta = {'source': source}
+    for kind, edge in settings.IMAGE_RENDITIONS.items():
+        (width, height), data = _encode(image, edge)
+        name = rendition_name(source, kind)
+        storage.delete(name)
+        name = storage.save(name, ContentFile(data))
+        meta[kind] = {'name': name, 'width': width, 'height': height, 'size': len(data)}
+    return meta
+
+
+def store(source, meta):
+    """Record ``meta`` on every product and user image uploaded as ``source``."""
+    now = timezone.now()
+    updated = 0
+    with transaction.atomic():
+        for model, field in TARGETS:
+            count = model.objects.filter(image=source).update(**{field: meta, 'updated_at': now})
+            if count:
+                caching.bump_version(model)
+            updated += count
+    return updated
+
+
+def existing(source):
+    """Metadata already rendered for ``source`` on any row, or ``None``."""
+    for model, field in TARGETS:
+        meta = model.objects.filter(image=source, **{f'{field}__source': source}).values_list(field, flat=True).first()
+        if meta:
+            return meta
+    return None
+
+
+def try_render(source):
+    """Like render(), but ``None`` when the file is missing or not an image Pillow reads."""
+    if not default_storage.exists(source):
+        return None
+    try:
+        return render(source)
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning('Could not render %s: %s', source, exc)
+        return None
+
+
+@tasks.task('render_image')
+def process(source):
+    """Render ``source`` unless another row already has it, and store the result."""
+    meta = existing(source) or try_render(source)
+    if meta is not None:
+        store(source, meta)
+    return meta
+
+
+def schedule(source):
+    """Queue the rendering of ``source`` unless it is already waiting to run.
+
+    A row saved while the task runs gets a task of its own, which picks up
+    the finished renditions through existing() or renders a file that was
+    missing the first time.
+    """
+    if not Task.objects.filter(name='render_image', status=Task.PENDING, kwargs__source=source).exists():
+        tasks.enqueue('render_image', source=source)
+
+
+def pending_sources(force=False):
+    """Names of the uploads whose renditions are missing or stale."""
+    sources = set()
+    for model, field in TARGETS:
+        rows = model.objects.exclude(image='').exclude(image=None).values_list('image', field)
+        for source, renditions in rows.iterator(chunk_size=5000):
+            if force or not is_current(renditions, source):
+                sources.add(source)
+    return sorted(sources)
+
+
+def rendition_data(renditions, source, kind, request=None):
+    """The ``url``, dimensions and byte size of one rendition, or ``None`` until it exists."""
+    if not is_current(renditions, source) or kind not in renditions:
+        return None
+    meta = renditions[kind]
+    url = get_storage().url(meta['name'])
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return {'url': url, 'width': meta['width'], 'height': meta['height'], 'size': meta['size']}
@@ -0,0 +1,122 @@
+"""Time-limited holds of farm product stock for the lines of a cart.
+
+Putting a product in a cart sets its quantity aside for
+``CART_HOLD_SECONDS``; what other shoppers can still add is the stock less
+the sum of the active holds, read from the (farm_product, expires_at,
+quantity) index rather than from the carts. Touching a line renews its hold,
+checkout takes the stock for good and drops the holds with the cart lines.
+
+Adding to a cart locks the farm product rows before summing their holds, so
+concurrent adds of a hot product are serialized on that row and can never
+hold more than its stock. Expired holds already count for nothing; the
+``expire_holds`` sweeper only deletes them to keep the table small.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import tasks
+from .models import CartItem, FarmProduct, StockHold
+
+
+def active_holds(now=None):
+    return StockHold.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(farm_product_ids, exclude_items=(), now=None):
+    """Sum of the active holds on each farm product, leaving out the cart lines ``exclude_items``."""
+    return dict(
+        active_holds(now).filter(farm_product_id__in=farm_product_ids)
+        .exclude(cart_item_id__in=exclude_items)
+        .values('farm_product_id').annotate(total=Sum('quantity'))
+        .values_list('farm_product_id', 'total')
+    )
+
+
+def available(farm_product_ids, exclude_items=(), now=None, lock=False):
+    """Stock of each farm product that is not held by cart lines other than ``exclude_items``.
+
+    With ``lock`` the farm product rows are locked, in id order, until the
+    end of the surrounding transaction.
+    """
+    stock = FarmProduct.objects.filter(pk__in=farm_product_ids)
+    if lock:
+        stock = stock.select_for_update().order_by('pk')
+    stock = dict(stock.values_list('pk', 'quantity'))
+    held = held_quantities(list(stock), exclude_items, now)
+    return {pk: max(quantity - held.get(pk, 0), 0) for pk, quantity in stock.items()}
+
+
+def shortages(wanted, existing, now=None):
+    """The entries of ``wanted`` ({farm_product_id: quantity}) that cannot be held.
+
+    Maps each of them to the quantity that is available. ``existing`` maps
+    farm product ids to the cart's current lines, whose own holds do not
+    count against them. The farm product rows stay locked, so the caller's
+    transaction can write the holds without racing other carts.
+    """
+    free = available(list(wanted), [item.pk for item in existing.values()], now, lock=True)
+    return {pk: free.get(pk, 0) for pk, quantity in wanted.items() if quantity > free.get(pk, 0)}
+
+
+def hold(items, now=None):
+    """Hold the quantity of each saved cart line in ``items`` for another ``CART_HOLD_SECONDS``."""
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=settings.CART_HOLD_SECONDS)
+    StockHold.objects.bulk_create(
+        [
+            StockHold(cart_item=item, farm_product_id=item.product_id, quantity=item.quantity, expires_at=expires_at)
+            for item in items
+        ],
+        update_conflicts=True,
+        unique_fields=['cart_item'],
+        update_fields=['farm_product', 'quantity', 'expires_at', 'updated_at'],
+    )
+
+
+def set_quantities(cart, wanted):
+    """Set the cart's quantity of each farm product in ``wanted`` and hold it.
+
+    A quantity of 0 removes the product. Nothing is written if any product
+    lacks the stock; the shortages are returned instead, see shortages().
+    """
+    with transaction.atomic():
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product_id__in=wanted)}
+        short = shortages({pk: quantity for pk, quantity in wanted.items() if quantity}, existing)
+        if short:
+            return short
+        to_create, to_update, to_delete, to_hold = [], [], [], []
+        for farm_product_id, quantity in wanted.items():
+            item = existing.get(farm_product_id)
+            if quantity == 0:
+                if item:
+                    to_delete.append(item.pk)
+                continue
+            if item is None:
+                item = CartItem(cart=cart, product_id=farm_product_id, quantity=quantity)
+                to_create.append(item)
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                to_update.append(item)
+            to_hold.append(item)
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+        CartItem.objects.bulk_create(to_create)
+        CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        hold(to_hold)
+    return {}
+
+
+@tasks.task('expire_holds')
+def expire(now=None, batch_size=1000):
+    """Delete the holds that have run out, ``batch_size`` at a time; return how many."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(StockHold.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += StockHold.objects.filter(pk__in=ids).delete()[0]
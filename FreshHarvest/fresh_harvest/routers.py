@@ -0,0 +1,92 @@
+"""Send the reads of read-only requests to a database replica.
+
+Views with ReplicaReadMixin run their GET and HEAD requests with reads
+routed to ``DATABASE_REPLICA_ALIAS``; every write, and every read of any
+other request, goes to the primary. A user who changes something through
+such a view, their cart or an order, is pinned to the primary for
+``DATABASE_REPLICA_STICKY_SECONDS`` so they read their own writes while the
+replica catches up. Reads inside a transaction on the primary stay on it.
+Responses that go into the response cache are built from the primary, as a
+lagging replica would otherwise be cached under the newest model versions.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import caching
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Route the reads in the block to the replica, if one is configured."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Route the reads in the block to the primary, even inside replica_reads()."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin(user_id):
+    """Keep the reads of ``user_id`` on the primary for a while."""
+    caching.get_cache().set(pin_key(user_id), True, timeout=settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(caching.get_cache().get(pin_key(user_id)))
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = settings.DATABASE_REPLICA_ALIAS
+        if alias and _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema along with the data.
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Read from the replica on safe requests; pin users who write to the primary."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if request.method in SAFE_METHODS and not (user.is_authenticated and is_pinned(user.pk)):
+            self._replica_token = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,187 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Sum, Value, When
+
+from .models import FarmProduct, SearchTerm, SearchToken
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 50
+MAX_PREFIX_EXPANSIONS = 50
+MAX_TYPO_DISTANCE = 1
+
+# How much a hit in each indexed field counts towards the rank of a product.
+FIELD_WEIGHTS = (
+    ('product.name', 8),
+    ('product.type', 4),
+    ('label', 4),
+    ('farm.name', 3),
+    ('farm.location', 2),
+    ('product.description', 1),
+)
+
+# Multipliers for how a query word matched an indexed token.
+EXACT_BOOST = 3
+PREFIX_BOOST = 2
+TYPO_BOOST = 1
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [
+        word[:MAX_TOKEN_LENGTH]
+        for word in TOKEN_RE.findall(text.lower())
+        if len(word) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def _field_value(farm_product, path):
+    value = farm_product
+    for attr in path.split('.'):
+        value = getattr(value, attr, None)
+    return value
+
+
+def document_tokens(farm_product):
+    weights = {}
+    for path, weight in FIELD_WEIGHTS:
+        for token in tokenize(_field_value(farm_product, path)):
+            weights[token] = max(weights.get(token, 0), weight)
+    return weights
+
+
+def index_farm_products(farm_products, batch_size=1000):
+    """Replace the indexed tokens of the given farm products.
+
+    The farm products should come with ``farm`` and ``product`` already
+    selected so building the documents does not query per row.
+    """
+    farm_products = list(farm_products)
+    if not farm_products:
+        return
+    tokens = []
+    terms = set()
+    for farm_product in farm_products:
+        for token, weight in document_tokens(farm_product).items():
+            tokens.append(SearchToken(farm_product_id=farm_product.pk, token=token, weight=weight))
+            terms.add(token)
+    with transaction.atomic():
+        SearchToken.objects.filter(farm_product__in=[fp.pk for fp in farm_products]).delete()
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term, length=len(term)) for term in terms],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        SearchToken.objects.bulk_create(tokens, batch_size=batch_size)
+
+
+def index_queryset(queryset, chunk_size=2000):
+    queryset = queryset.select_related('farm', 'product').order_by('pk')
+    chunk = []
+    for farm_product in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(farm_product)
+        if len(chunk) >= chunk_size:
+            index_farm_products(chunk)
+            chunk = []
+    index_farm_products(chunk)
+
+
+def rebuild_index(chunk_size=2000):
+    with transaction.atomic():
+        SearchToken.objects.all().delete()
+        SearchTerm.objects.all().delete()
+        index_queryset(FarmProduct.objects.all(), chunk_size=chunk_size)
+
+
+def _within_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _prefix_range(word):
+    return {'term__gte': word, 'term__lt': word + '\uffff'}
+
+
+def expand_word(word):
+    """Resolve one query word to indexed terms as ``(exact, prefix, typo)`` sets.
+
+    Prefix and typo lookups only touch the vocabulary table through its
+    indexes, so their cost depends on the vocabulary, not on catalog size.
+    """
+    prefix = set(
+        SearchTerm.objects.filter(**_prefix_range(word))
+        .order_by('length', 'term')
+        .values_list('term', flat=True)[:MAX_PREFIX_EXPANSIONS]
+    )
+    exact = {word} & prefix
+    prefix -= exact
+    typo = set()
+    if not prefix and not exact and len(word) > 3:
+        lengths = range(len(word) - MAX_TYPO_DISTANCE, len(word) + MAX_TYPO_DISTANCE + 1)
+        # Typos are assumed to spare the first letter, which keeps the
+        # candidate scan on a narrow slice of the (length, term) index.
+        candidates = SearchTerm.objects.filter(length__in=lengths, **_prefix_range(word[0]))
+        typo = {
+            term for term in candidates.values_list('term', flat=True)
+            if _within_distance(word, term, MAX_TYPO_DISTANCE)
+        }
+    return exact, prefix, typo
+
+
+def search(queryset, text):
+    """Filter ``queryset`` to farm products matching every word of ``text``.
+
+    The result is annotated with ``search_rank`` and ordered by it. Text
+    without any usable word leaves the newest products first.
+    """
+    words = list(dict.fromkeys(tokenize(text)))
+    if not words:
+        return queryset.order_by('-created_at', '-id')
+
+    exact_terms, prefix_terms, typo_terms = set(), set(), set()
+    word_matches = {}
+    for position, word in enumerate(words):
+        exact, prefix, typo = expand_word(word)
+        terms = exact | prefix | typo
+        if not terms:
+            return queryset.none()
+        exact_terms |= exact
+        prefix_terms |= prefix
+        typo_terms |= typo
+        word_matches[f'search_word_{position}'] = Max(Case(
+            When(search_tokens__token__in=terms, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+
+    rank_cases = [
+        When(search_tokens__token__in=terms, then=F('search_tokens__weight') * boost)
+        for terms, boost in (
+            (exact_terms, EXACT_BOOST),
+            (prefix_terms, PREFIX_BOOST),
+            (typo_terms, TYPO_BOOST),
+        )
+        if terms
+    ]
+    return (
+        queryset
+        .filter(search_tokens__token__in=exact_terms | prefix_terms | typo_terms)
+        .annotate(search_rank=Sum(Case(*rank_cases, default=Value(0), output_field=IntegerField())), **word_matches)
+        .filter(**{name: 1 for name in word_matches})
+        .order_by('-search_rank', 'pk')
+    )
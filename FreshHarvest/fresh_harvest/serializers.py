@@ -1,17 +1,82 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import caching, carts, renditions, reservations, tasks
+from .fieldsets import FieldSelection
 from .models import (
     User, Product, Farmer, Farm, FarmProduct, ProductImage,
-    Cart, CartItem, Review, Discount, Order, OrderItem, Recipe
+    Cart, CartItem, Review, Discount, Order, OrderItem, ProductOffer, Recipe, StockHold
 )
 
 
+class SparseFieldsMixin:
+    """Render only the fields in the view's ``field_selection``.
+
+    ``expandable_fields`` maps a field name to the serializer that replaces
+    it when the selection expands it. Nested serializers with this mixin get
+    their part of the selection from their parent.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, selection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if selection is not None:
+            self._selection = selection
+
+    @property
+    def selection(self):
+        selection = getattr(self, '_selection', None)
+        if selection is None:
+            parent = getattr(self, 'parent', None)
+            if parent is None or parent is self.root and isinstance(parent, serializers.ListSerializer):
+                selection = self.context.get('field_selection')
+        return selection or FieldSelection()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        selection.check(fields, self.expandable_fields)
+        for name, serializer_class in self.expandable_fields.items():
+            if name in selection.expand:
+                fields[name] = serializer_class(read_only=True)
+        if selection.fields is not None:
+            fields = {name: field for name, field in fields.items() if name in selection.fields}
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsMixin):
+                nested._selection = selection.child(name)
+        return fields
+
+
+def image_size(context, default):
+    """The rendition a request asks for with ``?image_size=``, else the view's default."""
+    request = context.get('request')
+    size = request.GET.get('image_size') if request is not None else None
+    if size is None:
+        return context.get('image_size', default)
+    if size not in settings.IMAGE_RENDITIONS:
+        raise serializers.ValidationError({'image_size': f"Must be one of: {', '.join(settings.IMAGE_RENDITIONS)}."})
+    return size
+
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
+    image_rendition = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'name', 'email_or_phone', 'location', 'image', 'password']
+        fields = ['id', 'name', 'email_or_phone', 'location', 'image', 'image_rendition', 'password']
+
+    def get_image_rendition(self, obj):
+        return renditions.rendition_data(
+            obj.image_renditions, obj.image.name, image_size(self.context, 'thumbnail'), self.context.get('request')
+        )
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
@@ -63,49 +128,68 @@ class FarmSerializer(serializers.ModelSerializer):
             'location'
         ]
 
-class FarmSimpleSerializer(serializers.ModelSerializer):
+class FarmSimpleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Farm
         fields = ['id', 'name','description' ,'location']
 
 
-class ProductSimpleSerializer(serializers.ModelSerializer):
+class ProductSimpleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'type','description']
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     products = ProductSimpleSerializer(many=True, read_only=True)
 
     class Meta:
         model = Recipe
         fields = ['id', 'name', 'products']
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    rendition = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'rendition']
+
+    def get_rendition(self, obj):
+        if not obj.image:
+            return None
+        return renditions.rendition_data(
+            obj.renditions, obj.image.name, image_size(self.context, 'card'), self.context.get('request')
+        )
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.name', read_only=True)
     class Meta:
         model = Review
         fields = ['id', 'user', 'user_name', 'rating', 'description', 'likes', 'dislikes', 'date']
+        read_only_fields = ['user', 'likes', 'dislikes']
 
-class FarmProductSerializer(serializers.ModelSerializer):
+class FarmProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     farm = FarmSimpleSerializer(read_only=True)
     product = ProductSimpleSerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
-    reviews = ReviewSerializer(many=True,read_only=True)
+    reviews = serializers.SerializerMethodField()
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     class Meta:
         model = FarmProduct
         fields = [
             'id', 'farm', 'product',
             'quantity', 'price', 'label', 'harvest_date',
+            'rating_avg', 'rating_count', 'rating_histogram',
             'images','reviews'
         ]
+        read_only_fields = ['rating_avg', 'rating_count']
+
+    def get_reviews(self, obj):
+        reviews = getattr(obj, 'recent_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.all()
+        return ReviewSerializer(reviews, many=True, selection=self.selection.child('reviews')).data
 
-class FarmProductSimpleSerializer(serializers.ModelSerializer):
+class FarmProductSimpleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     farm = FarmSimpleSerializer(read_only=True)
     product = ProductSimpleSerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
@@ -113,43 +197,176 @@ class FarmProductSimpleSerializer(serializers.ModelSerializer):
         model = FarmProduct
         fields = [
             'id', 'farm', 'product',
-             'price', 'label',
+             'price', 'label', 'rating_avg', 'rating_count',
             'images'
         ]
 
 class CartItemAddSerializer(serializers.Serializer):
     farm_product_id = serializers.IntegerField()
-    quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
+    quantity = serializers.IntegerField(min_value=1)
 
     def validate_farm_product_id(self, value):
         if not FarmProduct.objects.filter(id=value).exists():
             raise serializers.ValidationError("Farm product does not exist.")
         return value
 
-class CartItemSerializer(serializers.ModelSerializer):
-        product = FarmProductSerializer(read_only=True)
-        product_id = serializers.PrimaryKeyRelatedField(
-            queryset=FarmProduct.objects.all(),
-            source='product',
-            write_only=True
+class CartItemQuantitySerializer(serializers.Serializer):
+    # 0 removes the line.
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartBulkOperationSerializer(serializers.Serializer):
+    farm_product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartBulkSerializer(serializers.Serializer):
+    operations = CartBulkOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        ids = {operation['farm_product_id'] for operation in operations}
+        found = set(FarmProduct.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = sorted(ids - found)
+        if missing:
+            raise serializers.ValidationError(f"Farm products do not exist: {missing}")
+        return operations
+
+    def create(self, validated_data):
+        cart = validated_data['cart']
+        # Later operations on the same product win; quantity 0 removes it.
+        wanted = {operation['farm_product_id']: operation['quantity'] for operation in validated_data['operations']}
+        short = reservations.set_quantities(cart, wanted)
+        if short:
+            raise serializers.ValidationError(
+                {'operations': {farm_product_id: f'Only {count} available.' for farm_product_id, count in short.items()}}
+            )
+        carts.invalidate_cart(cart.user_id)
+        return cart
+
+
+
+class ProductOfferSerializer(serializers.ModelSerializer):
+    farm = FarmSimpleSerializer(source='farm_product.farm', read_only=True)
+
+    class Meta:
+        model = ProductOffer
+        fields = ['farm_product', 'farm', 'price', 'quantity']
+
+
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    best_offer = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'type', 'best_offer']
+
+    def get_best_offer(self, obj):
+        try:
+            offer = obj.best_offer
+        except ProductOffer.DoesNotExist:
+            return None
+        return ProductOfferSerializer(offer).data
+
+
+class RecipeCartSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def create(self, validated_data):
+        cart = validated_data['cart']
+        quantity = validated_data['quantity']
+        # One query resolves every ingredient to its best offer, if any.
+        offers = dict(
+            Product.objects.filter(recipes=validated_data['recipe'])
+            .values_list('pk', 'best_offer__farm_product_id')
+        )
+        wanted = {farm_product_id for farm_product_id in offers.values() if farm_product_id is not None}
+        with transaction.atomic():
+            existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product_id__in=wanted)}
+            totals = {pk: quantity + (existing[pk].quantity if pk in existing else 0) for pk in wanted}
+            # Ingredients whose best offer is held by other carts are left out.
+            wanted -= set(reservations.shortages(totals, existing))
+            to_create, to_update = [], []
+            for farm_product_id in wanted:
+                item = existing.get(farm_product_id)
+                if item is None:
+                    to_create.append(CartItem(cart=cart, product_id=farm_product_id, quantity=quantity))
+                else:
+                    item.quantity += quantity
+                    to_update.append(item)
+            CartItem.objects.bulk_create(to_create)
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+            reservations.hold(to_create + to_update)
+        carts.invalidate_cart(cart.user_id)
+        return {
+            'added': sorted(wanted),
+            'unavailable': sorted(
+                product_id for product_id, farm_product_id in offers.items() if farm_product_id not in wanted
+            ),
+        }
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    farm_product_id = serializers.IntegerField(source='product.id', read_only=True)
+    name = serializers.CharField(source='product.product.name', read_only=True)
+    farm_name = serializers.CharField(source='product.farm.name', read_only=True)
+    unit_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    line_total = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    held_until = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartItem
+        fields = [
+            'id', 'farm_product_id', 'name', 'farm_name', 'unit_price', 'quantity', 'line_total', 'thumbnail',
+            'held_until',
+        ]
+
+    def get_line_total(self, obj):
+        return serializers.DecimalField(max_digits=12, decimal_places=2).to_representation(
+            obj.product.price * obj.quantity
         )
-        class Meta:
-            model = CartItem
-            fields = ['id', 'product', 'product_id', 'quantity']
 
+    def get_held_until(self, obj):
+        try:
+            expires_at = obj.hold.expires_at
+        except StockHold.DoesNotExist:
+            return None
+        return serializers.DateTimeField().to_representation(expires_at)
+
+    def get_thumbnail(self, obj):
+        images = obj.product.images.all()
+        if not images or not images[0].image:
+            return None
+        image = images[0]
+        thumbnail = renditions.rendition_data(image.renditions, image.image.name, 'thumbnail')
+        return thumbnail['url'] if thumbnail else image.image.url
+
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    items = CartLineSerializer(source='cart_items', many=True, read_only=True)
+    item_count = serializers.SerializerMethodField()
+    subtotal = serializers.SerializerMethodField()
 
-class CartSerializer(serializers.ModelSerializer):
-    cart_items = CartItemSerializer(many=True, read_only=True)
     class Meta:
         model = Cart
-        fields = ['id', 'cart_items', 'active']
+        fields = ['id', 'active', 'items', 'item_count', 'subtotal']
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    farm_product = FarmProductSerializer(read_only=True)
+    def get_item_count(self, obj):
+        return sum(item.quantity for item in obj.cart_items.all())
+
+    def get_subtotal(self, obj):
+        subtotal = sum((item.product.price * item.quantity for item in obj.cart_items.all()), Decimal('0.00'))
+        return serializers.DecimalField(max_digits=12, decimal_places=2).to_representation(subtotal)
+
+
+class OrderLineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """An order line as it was at checkout, without touching the live catalog."""
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    expandable_fields = {'farm_product': FarmProductSimpleSerializer}
 
     class Meta:
         model = OrderItem
-        fields = ['id','farm_product','quantity']
+        fields = ['id', 'farm_product', 'product_name', 'farm_name', 'unit_price', 'quantity', 'line_total']
 
 class DiscountSerializer(serializers.ModelSerializer):
     class Meta:
@@ -157,8 +374,8 @@ class DiscountSerializer(serializers.ModelSerializer):
         fields = ['coupon_code', 'discount_percent']
         read_only_fields = ['coupon_code', 'discount_percent']
 
-class OrderDetailSerializer(serializers.ModelSerializer):
-    order_items = OrderItemSerializer(many=True, read_only=True)
+class OrderDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    order_items = OrderLineSerializer(many=True, read_only=True)
     class Meta:
         model = Order
         fields = ['id', 'total_bill', 'ordered_at', 'status', 'coupon', 'order_items']
@@ -170,11 +387,12 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
-    coupon_code = serializers.CharField(required=False, allow_blank=True)
+    coupon_code = serializers.CharField(required=False, allow_blank=True, write_only=True)
 
     class Meta:
         model = Order
-        fields = ['coupon_code']
+        fields = ['id', 'coupon_code', 'total_bill', 'status']
+        read_only_fields = ['id', 'total_bill', 'status']
 
     def create(self, validated_data):
         user = self.context['request'].user
@@ -182,32 +400,70 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         coupon = None
 
         if coupon_code:
-            try:
-                coupon = Discount.objects.get(coupon_code=coupon_code)
-            except Discount.DoesNotExist:
-                pass
-
-        cart_items = CartItem.objects.filter(cart__user=user, cart__active=True)
-        if not cart_items.exists():
-            raise serializers.ValidationError("Cart is empty")
-
-        total_bill = sum(item.product.price * item.quantity for item in cart_items)
-
-        order = Order.objects.create(
-            user=user,
-            total_bill=total_bill,
-            status='pending',
-            coupon=coupon
-        )
+            coupon = Discount.objects.filter(coupon_code=coupon_code).first()
 
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                farm_product=item.product,
-                quantity=item.quantity
+        with transaction.atomic():
+            cart_items = list(
+                CartItem.objects.filter(cart__user=user)
+                .select_related('product__product', 'product__farm')
+                .select_for_update()
             )
+            if not cart_items:
+                raise serializers.ValidationError("Cart is empty")
 
-        cart_items.delete()
+            self.reserve_stock(cart_items)
+
+            total_bill = sum(item.product.price * item.quantity for item in cart_items)
+            if coupon:
+                total_bill -= total_bill * coupon.discount_percent / Decimal('100')
+            total_bill = total_bill.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+            order = Order.objects.create(
+                user=user,
+                total_bill=total_bill,
+                status='pending',
+                coupon=coupon
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, farm_product=item.product, quantity=item.quantity, unit_price=item.product.price,
+                    product_name=item.product.product.name, farm_name=item.product.farm.name,
+                )
+                for item in cart_items
+            ])
+            CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+            transaction.on_commit(lambda: carts.invalidate_cart(user.pk))
 
         return order
-    
+
+    def reserve_stock(self, cart_items):
+        """Take every cart line out of stock with one conditional UPDATE.
+
+        Rows without enough stock besides what other carts hold fail the
+        ``quantity >= wanted + held`` guard, so a short row count means the
+        cart cannot be fulfilled and the whole checkout is rolled back. The
+        cart's own holds go with its lines.
+        """
+        wanted = Case(
+            *[When(pk=item.product_id, then=Value(item.quantity)) for item in cart_items],
+            output_field=IntegerField(),
+        )
+        held = (
+            reservations.active_holds().filter(farm_product=OuterRef('pk'))
+            .exclude(cart_item_id__in=[item.pk for item in cart_items])
+            .values('farm_product').annotate(total=Sum('quantity')).values('total')
+        )
+        updated = (
+            FarmProduct.objects
+            .filter(
+                pk__in=[item.product_id for item in cart_items],
+                quantity__gte=wanted + Coalesce(Subquery(held), 0, output_field=IntegerField()),
+            )
+            .update(quantity=F('quantity') - wanted, updated_at=timezone.now())
+        )
+        if updated != len(cart_items):
+            raise serializers.ValidationError("Not enough stock to fulfil the order")
+        # Queryset updates skip post_save, so drop cached catalog pages by
+        # hand and leave the best offers to a background task.
+        caching.bump_version(FarmProduct)
+        tasks.enqueue('refresh_offers', product_ids=sorted({item.product.product_id for item in cart_items}))
@@ -0,0 +1,108 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import authentication, availability, caching, metrics, ratings, renditions, search
+from .models import Discount, Farm, Farmer, FarmProduct, Product, ProductImage, Recipe, Review, User
+
+CACHED_MODELS = (Farmer, Farm, Product, FarmProduct, ProductImage, Review, Discount, Recipe)
+
+
+@receiver(post_save, sender=FarmProduct)
+def index_farm_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_farm_products([instance])
+
+
+@receiver(post_save, sender=FarmProduct)
+def refresh_offer_after_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    availability.refresh_for_farm_product(instance)
+
+
+@receiver(post_delete, sender=FarmProduct)
+def refresh_offer_after_delete(sender, instance, **kwargs):
+    # The offer row of a deleted farm product has already cascaded away.
+    availability.refresh([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def index_product_farm_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.index_queryset(FarmProduct.objects.filter(product=instance))
+
+
+@receiver(post_save, sender=Farm)
+def index_farm_farm_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.index_queryset(FarmProduct.objects.filter(farm=instance))
+
+
+def bump_cache_version(sender, **kwargs):
+    caching.bump_version(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_save_{model.__name__}')
+    post_delete.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    authentication.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=ProductImage)
+def render_product_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if not renditions.is_current(instance.renditions, instance.image.name):
+        renditions.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=User)
+def render_user_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if not renditions.is_current(instance.image_renditions, instance.image.name):
+        renditions.schedule(instance.image.name)
+
+
+@receiver(m2m_changed, sender=Recipe.products.through)
+def bump_recipe_cache_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.bump_version(Recipe)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    instance._rating_before_save = None
+    if raw or instance.pk is None:
+        return
+    previous = Review.objects.filter(pk=instance.pk).values_list('farm_product_id', 'rating').first()
+    instance._rating_before_save = previous
+
+
+@receiver(post_save, sender=Review)
+def update_rating_after_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.farm_product_id, instance.rating)
+    previous = getattr(instance, '_rating_before_save', None)
+    if previous != current:
+        ratings.review_changed(previous, current)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_after_delete(sender, instance, **kwargs):
+    ratings.review_changed((instance.farm_product_id, instance.rating), None)
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    metrics.install_query_recording(connection)
@@ -0,0 +1,182 @@
+"""A small database-backed task queue for slow side effects.
+
+Work is enqueued as a Task row inside the caller's transaction, so it only
+becomes visible to workers if that transaction commits. The
+``process_tasks`` command claims due tasks, highest priority first, and runs
+them in a pool of worker processes. A failed task is retried with
+exponential backoff until it runs out of attempts, and a task whose worker
+died is claimed again once its lease runs out.
+
+Task functions are registered by name with the ``task`` decorator and take
+JSON serializable keyword arguments::
+
+    @tasks.task('refresh_offers')
+    def refresh_offers(product_ids):
+        ...
+
+    tasks.enqueue('refresh_offers', product_ids=[1, 2])
+"""
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+REGISTRY = {}
+
+
+def task(name, priority=0, max_attempts=None):
+    """Register the decorated function as the task ``name``."""
+    def decorator(func):
+        REGISTRY[name] = func
+        func.task_options = {'priority': priority, 'max_attempts': max_attempts or settings.TASK_MAX_ATTEMPTS}
+        return func
+    return decorator
+
+
+def enqueue(name, /, key=None, priority=None, delay=None, **kwargs):
+    """Queue the task ``name`` with ``kwargs`` and return its Task row.
+
+    With an idempotency ``key`` the task is only queued once; enqueuing the
+    same key again returns the existing row, whatever its state. ``delay``
+    is a timedelta to wait before the task is due.
+    """
+    options = REGISTRY[name].task_options
+    fields = {
+        'name': name,
+        'kwargs': kwargs,
+        'priority': options['priority'] if priority is None else priority,
+        'max_attempts': options['max_attempts'],
+        'run_at': timezone.now() + (delay or timedelta()),
+    }
+    if key is None:
+        return Task.objects.create(**fields)
+    queued, _ = Task.objects.get_or_create(idempotency_key=key, defaults=fields)
+    return queued
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a task that failed ``attempts`` times."""
+    return min(settings.TASK_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.TASK_RETRY_BACKOFF_MAX_SECONDS)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit):
+    """Mark up to ``limit`` due tasks as running under ``worker`` and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Tasks of a worker that died mid-run are handed out again.
+        Task.objects.filter(
+            status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=settings.TASK_LEASE_SECONDS)
+        ).update(status=Task.PENDING, updated_at=now)
+        ids = list(
+            Task.objects.filter(status=Task.PENDING, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:limit]
+        )
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1, updated_at=now,
+        )
+    return list(Task.objects.filter(pk__in=ids).order_by('-priority', 'run_at', 'id'))
+
+
+def execute(name, kwargs):
+    """Run one task and return its traceback if it raised, else ``None``."""
+    try:
+        REGISTRY[name](**kwargs)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def finish(claimed, error=None):
+    """Record the outcome of a ``claimed`` task, scheduling a retry if it failed."""
+    now = timezone.now()
+    if error is None:
+        fields = {'status': Task.DONE, 'finished_at': now, 'last_error': ''}
+    elif claimed.attempts >= claimed.max_attempts:
+        fields = {'status': Task.FAILED, 'finished_at': now, 'last_error': error}
+    else:
+        fields = {
+            'status': Task.PENDING, 'last_error': error,
+            'run_at': now + timedelta(seconds=backoff(claimed.attempts)),
+        }
+    # A worker whose lease ran out no longer owns the task.
+    Task.objects.filter(pk=claimed.pk, status=Task.RUNNING, locked_by=claimed.locked_by).update(
+        locked_at=None, updated_at=now, **fields,
+    )
+
+
+def run_pending(worker=None, limit=100):
+    """Run due tasks in this process until none are left; return how many ran."""
+    worker = worker or worker_name()
+    count = 0
+    while True:
+        batch = claim(worker, limit)
+        if not batch:
+            return count
+        for claimed in batch:
+            finish(claimed, execute(claimed.name, claimed.kwargs))
+        count += len(batch)
+
+
+def _init_process():
+    django.setup()
+    # Connections inherited from the parent must not be shared.
+    connections.close_all()
+
+
+def _result(future):
+    try:
+        return future.result()
+    except Exception:
+        # The worker process itself died, e.g. it was killed.
+        return traceback.format_exc()
+
+
+def work(processes=2, poll_interval=1.0, once=False, worker=None):
+    """Keep ``processes`` worker processes busy with due tasks.
+
+    With ``once`` it returns when no task is due, otherwise it polls every
+    ``poll_interval`` seconds. Returns the number of tasks run. With no
+    processes the tasks run in this process instead.
+    """
+    worker = worker or worker_name()
+    if not processes:
+        count = run_pending(worker)
+        while not once:
+            time.sleep(poll_interval)
+            count += run_pending(worker)
+        return count
+
+    connections.close_all()
+    count = 0
+    running = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_process) as pool:
+        while True:
+            free = processes - len(running)
+            if free:
+                for claimed in claim(worker, free):
+                    running[pool.submit(execute, claimed.name, claimed.kwargs)] = claimed
+            if not running:
+                if once:
+                    return count
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), _result(future))
+                count += 1
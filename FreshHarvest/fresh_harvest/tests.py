@@ -1,3 +1,1412 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import warnings
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    User, Product, Farmer, Farm, FarmProduct, ProductImage, Review,
+    Cart, CartItem, DailySales, Discount, Order, OrderItem, ProductOffer, Recipe, SearchToken, StockHold, Task
+)
+from . import (
+    analytics, authentication, benchmark, counters, imports, metrics, query_plans, ratings, renderers, renditions,
+    reservations, routers, tasks, throttling,
+)
+from .views import FarmProductViewSet, OrderViewSet, get_number_param
+
+
+def make_catalog(products=10, reviews_per_product=3):
+    farmer = Farmer.objects.create(name='Farmer', description='Grows things')
+    farm = Farm.objects.create(farmer=farmer, name='Farm', description='A farm', location='Valley')
+    reviewers = [
+        User.objects.create_user(email_or_phone=f'reviewer{i}@example.com', username=f'reviewer{i}',
+                                 name=f'Reviewer {i}', password='secret')
+        for i in range(reviews_per_product)
+    ]
+    farm_products = []
+    for i in range(products):
+        product = Product.objects.create(name=f'Product {i}', description='Fresh', type='fruit')
+        farm_product = FarmProduct.objects.create(farm=farm, product=product, quantity=10, price=Decimal('2.50'))
+        ProductImage.objects.create(product=farm_product, image=f'product_{i}.png')
+        for reviewer in reviewers:
+            Review.objects.create(user=reviewer, farm_product=farm_product, rating=4, description='Good')
+        farm_products.append(farm_product)
+    return farm_products
+
+
+class FarmProductListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=12, reviews_per_product=7)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def list_query_count(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/farm-products/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant_across_page_sizes(self):
+        self.assertEqual(self.list_query_count(2), self.list_query_count(12))
+
+    def test_cursor_walks_whole_catalog(self):
+        seen = []
+        url = '/api/v1/farm-products/?page_size=5'
+        while url:
+            response = self.client.get(url)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(fp.id for fp in self.farm_products))
+
+    def test_list_caps_embedded_reviews(self):
+        response = self.client.get('/api/v1/farm-products/')
+        for item in response.data['results']:
+            self.assertEqual(len(item['reviews']), FarmProductViewSet.review_preview_limit)
+
+    def test_reviews_action_pages_all_reviews(self):
+        farm_product = self.farm_products[0]
+        response = self.client.get(f'/api/v1/farm-products/{farm_product.id}/reviews/', {'page_size': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertEqual(response.data['results'][0]['user_name'], 'Reviewer 6')
+
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = Farmer.objects.create(name='Farmer', description='Grows things')
+        cls.hill = Farm.objects.create(farmer=farmer, name='Hill Farm', description='', location='Kathmandu')
+        cls.river = Farm.objects.create(farmer=farmer, name='River Farm', description='', location='Pokhara')
+        apple = Product.objects.create(name='Apple', description='Crisp apples, lovely next to a tomato', type='fruit')
+        tomato = Product.objects.create(name='Tomato', description='Sweet and red', type='vegetable')
+        cls.hill_apple = FarmProduct.objects.create(farm=cls.hill, product=apple, quantity=5, price=Decimal('3.00'))
+        cls.river_apple = FarmProduct.objects.create(farm=cls.river, product=apple, quantity=5, price=Decimal('6.00'))
+        cls.tomato = FarmProduct.objects.create(farm=cls.river, product=tomato, quantity=5, price=Decimal('2.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search_ids(self, **params):
+        response = self.client.get('/api/v1/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_ranks_above_description(self):
+        self.assertEqual(self.search_ids(q='tomato')[0], self.tomato.id)
+        self.assertEqual(len(self.search_ids(q='tomato')), 3)
+
+    def test_prefix_and_typo_matching(self):
+        self.assertEqual(set(self.search_ids(q='app')), {self.hill_apple.id, self.river_apple.id})
+        self.assertEqual(self.search_ids(q='tomatp')[0], self.tomato.id)
+
+    def test_text_without_words_lists_newest_first(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            ids = self.search_ids(q='a')
+        self.assertEqual(ids, [self.tomato.id, self.river_apple.id, self.hill_apple.id])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search_ids(q='apple pokhara'), [self.river_apple.id])
+
+    def test_filters(self):
+        self.assertEqual(self.search_ids(q='apple', max_price='4'), [self.hill_apple.id])
+        self.assertEqual(self.search_ids(type='vegetable'), [self.tomato.id])
+        self.assertEqual(set(self.search_ids(farm=self.river.id)), {self.river_apple.id, self.tomato.id})
+        response = self.client.get('/api/v1/search/', {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_farm_rename(self):
+        self.hill.location = 'Lalitpur'
+        self.hill.save()
+        self.assertEqual(self.search_ids(q='lalitpur'), [self.hill_apple.id])
+        self.assertEqual(self.search_ids(q='kathmandu'), [])
+
+
+def make_user(index):
+    return User.objects.create_user(email_or_phone=f'buyer{index}@example.com', username=f'buyer{index}',
+                                    name=f'Buyer {index}', password='secret')
+
+
+def fill_cart(user, farm_products, quantity=1):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post('/api/v1/cart/bulk/', {
+        'operations': [{'farm_product_id': fp.id, 'quantity': quantity} for fp in farm_products],
+    }, format='json')
+    assert response.status_code == 200, response.data
+    return Cart.objects.get(user=user)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=8, reviews_per_product=0)
+        cls.user = make_user(0)
+        Discount.objects.create(coupon_code='HARVEST10', discount_percent=Decimal('10.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout_query_count(self, cart_size):
+        Cart.objects.filter(user=self.user).delete()
+        fill_cart(self.user, self.farm_products[:cart_size])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/v1/orders/', {'coupon_code': 'HARVEST10'})
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant_across_cart_sizes(self):
+        self.assertEqual(self.checkout_query_count(1), self.checkout_query_count(8))
+
+    def test_discount_and_stock_are_applied(self):
+        fill_cart(self.user, self.farm_products[:2], quantity=3)
+        response = self.client.post('/api/v1/orders/', {'coupon_code': 'HARVEST10'})
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_bill, Decimal('13.50'))
+        self.assertEqual(order.order_items.count(), 2)
+        self.assertEqual(FarmProduct.objects.get(pk=self.farm_products[0].pk).quantity, 7)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+
+    def test_insufficient_stock_rolls_back(self):
+        fill_cart(self.user, self.farm_products[:2], quantity=3)
+        FarmProduct.objects.filter(pk=self.farm_products[1].pk).update(quantity=2)
+        response = self.client.post('/api/v1/orders/', {})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(FarmProduct.objects.get(pk=self.farm_products[0].pk).quantity, 10)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.user).count(), 2)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def setUp(self):
+        self.farm_product = make_catalog(products=1, reviews_per_product=0)[0]
+        self.users = [make_user(i) for i in range(self.buyers)]
+        FarmProduct.objects.filter(pk=self.farm_product.pk).update(quantity=self.buyers)
+        for user in self.users:
+            fill_cart(user, [self.farm_product])
+        # With the holds run out every buyer competes for what is left.
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        FarmProduct.objects.filter(pk=self.farm_product.pk).update(quantity=self.stock)
+
+    def checkout(self, user, barrier, statuses):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            statuses.append(client.post('/api/v1/orders/', {}).status_code)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+        threads = [
+            threading.Thread(target=self.checkout, args=(user, barrier, statuses))
+            for user in self.users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(400), self.buyers - self.stock)
+        self.assertEqual(FarmProduct.objects.get(pk=self.farm_product.pk).quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), self.stock)
+
+
+class ReviewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(products=1, reviews_per_product=1)
+        cls.review = Review.objects.get()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_like_and_dislike_update_in_place(self):
+        url = f'/api/v1/reviews/{self.review.pk}/'
+        self.client.patch(url + 'increase_like/')
+        response = self.client.patch(url + 'increase_like/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'id': self.review.pk, 'likes': 2, 'dislikes': 0})
+        response = self.client.patch(url + 'increase_dislike/')
+        self.assertEqual(response.data['dislikes'], 1)
+
+    def test_missing_review(self):
+        response = self.client.patch('/api/v1/reviews/999999/increase_like/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_reviews_cannot_be_written_directly(self):
+        url = f'/api/v1/reviews/{self.review.pk}/'
+        other = make_user(0)
+        response = self.client.patch(url, {'user': other.pk, 'description': 'hijacked', 'likes': 999})
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertEqual(self.client.post('/api/v1/reviews/', {'rating': 5}).status_code, 405)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 0)
+        self.assertNotEqual(self.review.description, 'hijacked')
+        self.assertNotEqual(self.review.user_id, other.pk)
+
+    @override_settings(REVIEW_COUNTER_WRITE_BEHIND=True)
+    def test_write_behind_buffers_until_flush(self):
+        buffer = counters.ReviewCounterBuffer(interval=60)
+        with mock.patch.object(counters, 'get_buffer', return_value=buffer):
+            for _ in range(3):
+                response = self.client.patch(f'/api/v1/reviews/{self.review.pk}/increase_like/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['likes'], 3)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 0)
+
+        buffer._timer.cancel()
+        buffer.flush()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 3)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=3, reviews_per_product=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_repeat_requests_skip_the_database(self):
+        first = self.client.get('/api/v1/farm-products/')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/v1/farm-products/')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get('/api/v1/farmers/')['ETag']
+        response = self.client.get('/api/v1/farmers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_saving_a_related_model_invalidates(self):
+        url = f'/api/v1/farm-products/{self.farm_products[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        product = self.farm_products[0].product
+        product.name = 'Renamed'
+        product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product']['name'], 'Renamed')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_product, cls.other = make_catalog(products=2, reviews_per_product=0)
+        cls.user = make_user(0)
+
+    def assertRatings(self, farm_product, avg, count, histogram):
+        farm_product.refresh_from_db()
+        self.assertEqual(farm_product.rating_avg, Decimal(avg))
+        self.assertEqual(farm_product.rating_count, count)
+        self.assertEqual(farm_product.rating_histogram, histogram)
+
+    def test_aggregates_follow_review_lifecycle(self):
+        review = Review.objects.create(user=self.user, farm_product=self.farm_product, rating=5, description='')
+        Review.objects.create(user=self.user, farm_product=self.farm_product, rating=2, description='')
+        self.assertRatings(self.farm_product, '3.50', 2, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        review.rating = 4
+        review.save()
+        self.assertRatings(self.farm_product, '3.00', 2, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+
+        review.farm_product = self.other
+        review.save()
+        self.assertRatings(self.farm_product, '2.00', 1, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0})
+        self.assertRatings(self.other, '4.00', 1, {1: 0, 2: 0, 3: 0, 4: 1, 5: 0})
+
+        review.delete()
+        self.assertRatings(self.other, '0.00', 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_recompute_matches_incremental(self):
+        for rating in (1, 3, 3, 5):
+            Review.objects.create(user=self.user, farm_product=self.farm_product, rating=rating, description='')
+        FarmProduct.objects.update(rating_avg=0, rating_count=0, rating_3_count=0)
+        ratings.recompute_all()
+        self.assertRatings(self.farm_product, '3.00', 4, {1: 1, 2: 0, 3: 2, 4: 0, 5: 1})
+
+    def test_sort_and_filter_by_rating(self):
+        Review.objects.create(user=self.user, farm_product=self.other, rating=5, description='')
+        Review.objects.create(user=self.user, farm_product=self.farm_product, rating=2, description='')
+        client = APIClient()
+        response = client.get('/api/v1/farm-products/', {'ordering': '-rating_avg'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.other.id, self.farm_product.id])
+        self.assertEqual(response.data['results'][0]['rating_histogram']['5'], 1)
+        response = client.get('/api/v1/search/', {'min_rating': '4'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.other.id])
+        self.assertEqual(client.get('/api/v1/farm-products/', {'min_rating': 'Infinity'}).status_code, 400)
+        self.assertEqual(client.get('/api/v1/search/', {'min_price': 'NaN'}).status_code, 400)
+        self.assertEqual(client.get('/api/v1/async/search/', {'min_price': 'NaN'}).status_code, 400)
+
+
+class CartReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=6, reviews_per_product=4)
+        cls.user = make_user(0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def read_query_count(self, cart_size):
+        Cart.objects.filter(user=self.user).delete()
+        fill_cart(self.user, self.farm_products[:cart_size], quantity=2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/cart/')
+        self.assertEqual(len(response.data['items']), cart_size)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant_across_cart_sizes(self):
+        self.assertEqual(self.read_query_count(1), self.read_query_count(6))
+
+    def test_compact_lines_and_subtotal(self):
+        fill_cart(self.user, self.farm_products[:2], quantity=3)
+        response = self.client.get('/api/v1/cart/')
+        self.assertEqual(response.data['subtotal'], '15.00')
+        self.assertEqual(response.data['item_count'], 6)
+        line = response.data['items'][0]
+        self.assertEqual(line['line_total'], '7.50')
+        self.assertEqual(line['name'], 'Product 0')
+        self.assertNotIn('reviews', line)
+
+    def test_reading_an_empty_cart_does_not_create_one(self):
+        response = self.client.get('/api/v1/cart/')
+        self.assertEqual(response.data['items'], [])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_snapshot_is_cached_until_the_cart_changes(self):
+        self.client.post('/api/v1/cart/', {'farm_product_id': self.farm_products[0].id, 'quantity': 1})
+        self.client.get('/api/v1/cart/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/v1/cart/')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.client.post('/api/v1/cart/', {'farm_product_id': self.farm_products[1].id, 'quantity': 1})
+        self.assertEqual(len(self.client.get('/api/v1/cart/').data['items']), 2)
+
+        item = CartItem.objects.get(cart__user=self.user, product=self.farm_products[0])
+        self.client.delete(f'/api/v1/cart/{item.id}/')
+        self.assertEqual(len(self.client.get('/api/v1/cart/').data['items']), 1)
+
+
+class CartBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=10, reviews_per_product=0)
+        cls.user = make_user(0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, operations):
+        return self.client.post('/api/v1/cart/bulk/', {'operations': operations}, format='json')
+
+    def test_adds_updates_and_removes_in_one_call(self):
+        fill_cart(self.user, self.farm_products[:3])
+        response = self.bulk([
+            {'farm_product_id': self.farm_products[0].id, 'quantity': 0},
+            {'farm_product_id': self.farm_products[1].id, 'quantity': 4},
+            {'farm_product_id': self.farm_products[5].id, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['farm_product_id']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {
+            self.farm_products[1].id: 4,
+            self.farm_products[2].id: 1,
+            self.farm_products[5].id: 2,
+        })
+
+    def test_query_count_does_not_grow_with_operations(self):
+        Cart.objects.create(user=self.user)
+
+        def query_count(size):
+            CartItem.objects.all().delete()
+            operations = [{'farm_product_id': fp.id, 'quantity': 1} for fp in self.farm_products[:size]]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.bulk(operations).status_code, 200)
+            return len(ctx.captured_queries)
+        self.assertEqual(query_count(2), query_count(10))
+
+    def test_unknown_products_reject_the_whole_batch(self):
+        response = self.bulk([
+            {'farm_product_id': self.farm_products[0].id, 'quantity': 1},
+            {'farm_product_id': 999999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class CartHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_product = make_catalog(products=1, reviews_per_product=0)[0]
+        cls.users = [make_user(i) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.clients = []
+        for user in self.users:
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients.append(client)
+
+    def add(self, client, quantity):
+        return client.post('/api/v1/cart/', {'farm_product_id': self.farm_product.id, 'quantity': quantity})
+
+    def test_holds_leave_other_shoppers_the_rest_of_the_stock(self):
+        self.assertEqual(self.add(self.clients[0], 7).status_code, 201)
+        response = self.add(self.clients[1], 5)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['quantity'], 'Only 3 available.')
+        self.assertEqual(self.add(self.clients[1], 3).status_code, 201)
+        self.assertEqual(reservations.available([self.farm_product.id]), {self.farm_product.id: 0})
+
+        # A cart's own hold does not count against changing its line.
+        item = CartItem.objects.get(cart__user=self.users[0])
+        self.assertEqual(self.clients[0].patch(f'/api/v1/cart/{item.id}/', {'quantity': 8}).status_code, 400)
+        self.assertEqual(self.clients[0].patch(f'/api/v1/cart/{item.id}/', {'quantity': 4}).status_code, 200)
+        for quantity in (1.5, [1], -1, None):
+            response = self.clients[0].patch(f'/api/v1/cart/{item.id}/', {'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 400, quantity)
+        self.assertEqual(self.add(self.clients[2], -1).status_code, 400)
+        with self.assertRaises(ValidationError):
+            get_number_param({'quantity': [1]}, 'quantity', int)
+        for value in ('NaN', 'Infinity', '-inf', 'sNaN'):
+            with self.assertRaises(ValidationError):
+                get_number_param({'min_price': value}, 'min_price', Decimal)
+        self.assertEqual(StockHold.objects.get(cart_item=item).quantity, 4)
+        self.clients[0].delete(f'/api/v1/cart/{item.id}/')
+        self.assertEqual(reservations.available([self.farm_product.id]), {self.farm_product.id: 7})
+
+    def test_expired_holds_free_the_stock_and_are_swept(self):
+        self.assertEqual(self.add(self.clients[0], 10).status_code, 201)
+        self.assertEqual(self.add(self.clients[1], 1).status_code, 400)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.clients[1], 10).status_code, 201)
+
+        out = io.StringIO()
+        call_command('expire_holds', stdout=out)
+        self.assertIn('Expired 1 holds.', out.getvalue())
+        self.assertEqual(list(StockHold.objects.values_list('cart_item__cart__user', flat=True)), [self.users[1].pk])
+
+    def test_checkout_leaves_stock_held_by_other_carts(self):
+        self.assertEqual(self.add(self.clients[1], 3).status_code, 201)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.clients[0], 8).status_code, 201)
+        self.assertEqual(self.clients[1].post('/api/v1/orders/', {}).status_code, 400)
+
+        self.assertEqual(self.clients[0].post('/api/v1/orders/', {}).status_code, 201)
+        self.assertEqual(FarmProduct.objects.get(pk=self.farm_product.pk).quantity, 2)
+        self.assertFalse(StockHold.objects.filter(cart_item__cart__user=self.users[0]).exists())
+
+    def test_cart_lines_show_until_when_they_are_held(self):
+        self.add(self.clients[0], 2)
+        line = self.clients[0].get('/api/v1/cart/').data['items'][0]
+        self.assertEqual(line['held_until'], StockHold.objects.get().expires_at.isoformat().replace('+00:00', 'Z'))
+
+    def test_bulk_and_recipe_adds_hold_only_what_is_available(self):
+        self.add(self.clients[0], 9)
+        response = self.clients[1].post('/api/v1/cart/bulk/', {
+            'operations': [{'farm_product_id': self.farm_product.id, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.users[1]).exists())
+
+        recipe = Recipe.objects.create(name='Salad')
+        recipe.products.set([self.farm_product.product])
+        url = f'/api/v1/recipe/{recipe.pk}/add-to-cart/'
+        response = self.clients[1].post(url, {'quantity': 2}, format='json')
+        self.assertEqual(response.data['unavailable'], [self.farm_product.product_id])
+        response = self.clients[1].post(url, {'quantity': 1}, format='json')
+        self.assertEqual(response.data['unavailable'], [])
+        self.assertEqual(reservations.available([self.farm_product.id]), {self.farm_product.id: 0})
+
+
+class ConcurrentCartHoldTests(TransactionTestCase):
+    shoppers = 100
+    stock = 10
+
+    def setUp(self):
+        self.farm_product = make_catalog(products=1, reviews_per_product=0)[0]
+        FarmProduct.objects.filter(pk=self.farm_product.pk).update(quantity=self.stock)
+        self.users = [make_user(i) for i in range(self.shoppers)]
+
+    def add(self, user, barrier, statuses):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            statuses.append(
+                client.post('/api/v1/cart/', {'farm_product_id': self.farm_product.id, 'quantity': 1}).status_code
+            )
+        finally:
+            connections.close_all()
+
+    def test_concurrent_adds_never_hold_more_than_the_stock(self):
+        barrier = threading.Barrier(self.shoppers)
+        statuses = []
+        threads = [threading.Thread(target=self.add, args=(user, barrier, statuses)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(400), self.shoppers - self.stock)
+        self.assertEqual(StockHold.objects.count(), self.stock)
+        self.assertEqual(CartItem.objects.count(), self.stock)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.farm_product = make_catalog(products=1, reviews_per_product=0)[0]
+        self.user = make_user(0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def query_counts(self, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_catalog_reads_go_to_the_replica(self):
+        primary, replica = self.query_counts('/api/v1/search/?q=product')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        primary, replica = self.query_counts('/api/v1/async/search/?q=product')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cached_responses_are_built_from_the_primary(self):
+        for url in ('/api/v1/farm-products/', '/api/v1/async/farmers/'):
+            primary, replica = self.query_counts(url)
+            self.assertGreater(primary, 0)
+            self.assertEqual(replica, 0)
+            self.assertEqual(self.query_counts(url), (0, 0))
+
+    def test_users_read_their_own_writes_from_the_primary(self):
+        response = self.client.post('/api/v1/cart/', {'farm_product_id': self.farm_product.id, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        primary, replica = self.query_counts('/api/v1/cart/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Once the pin runs out the cart is read from the replica again.
+        cache.clear()
+        primary, replica = self.query_counts('/api/v1/cart/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_and_transactions_stay_on_the_primary(self):
+        router = routers.PrimaryReplicaRouter()
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(FarmProduct), 'replica')
+            self.assertEqual(router.db_for_write(FarmProduct), 'default')
+            with transaction.atomic():
+                self.assertIsNone(router.db_for_read(FarmProduct))
+        self.assertIsNone(router.db_for_read(FarmProduct))
+
+    def test_connections_run_in_wal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+
+class JSONRendererTests(TestCase):
+    def sample(self):
+        image = ProductImage(image='apples.png')
+        return {
+            'price': Decimal('2.50'),
+            'at': timezone.now(),
+            'on': timezone.now().date(),
+            'label': gettext_lazy('Fresh'),
+            'image': image.image,
+            'missing': ProductImage().image,
+            'errors': {7: ['Only 3 available.']},
+            'text': 'line\u2028separator é',
+        }
+
+    def render(self, data, *args):
+        return renderers.FastJSONRenderer().render(data, *args)
+
+    def test_orjson_output_matches_the_stdlib_fallback(self):
+        data = self.sample()
+        with mock.patch.object(renderers, 'orjson', None):
+            expected = self.render(data)
+        self.assertEqual(self.render(data), expected)
+        parsed = json.loads(expected)
+        self.assertEqual(parsed['price'], 2.5)
+        self.assertTrue(parsed['image'].endswith('apples.png'))
+        self.assertIsNone(parsed['missing'])
+        self.assertIn(b'\\u2028', expected)
+
+    def test_indented_output_falls_back_to_the_stdlib(self):
+        self.assertEqual(self.render({'a': 1}, 'application/json; indent=4'), b'{\n    "a": 1\n}')
+
+    def test_parser(self):
+        parser = renderers.FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"a": [1, 2.5, "é"]}'.encode())), {'a': [1, 2.5, 'é']})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": NaN}'))
+
+    def test_benchmark_reports_identical_bodies(self):
+        make_catalog(products=3, reviews_per_product=2)
+        results = benchmark.run_json(iterations=1)
+        self.assertEqual(set(results), {'catalog page', 'cart', 'order history'})
+        for backends in results.values():
+            self.assertEqual(len({row['bytes'] for row in backends.values()}), 1)
+            self.assertTrue(all(row['render_bytes_per_second'] > 0 for row in backends.values()))
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(products=40, reviews_per_product=3)
+        user = make_user(0)
+        Order.objects.bulk_create([Order(user=user, status='pending') for _ in range(20)])
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(query_plans.check_hot_queries(), {})
+
+    def test_full_scans_are_detected(self):
+        self.assertTrue(query_plans.full_scans(Product.objects.filter(description='Fresh')))
+        self.assertTrue(query_plans.full_scans(Farm.objects.order_by('location')))
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_data_and_benchmark(self):
+        call_command(
+            'generate_data', users=5, farmers=3, products=8, farm_products=20, reviews=40,
+            orders=6, recipes=2, chunk_size=7, stdout=io.StringIO(),
+        )
+        self.assertEqual(FarmProduct.objects.count(), 20)
+        self.assertEqual(Review.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 6)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertTrue(SearchToken.objects.exists())
+        self.assertEqual(sum(FarmProduct.objects.values_list('rating_count', flat=True)), 40)
+
+        results = benchmark.run(iterations=2, warmup=0, user=benchmark.pick_user(), host='testserver')
+        self.assertIn('orders list', results)
+        for name, row in results.items():
+            self.assertEqual(row['status'], 200, name)
+        self.assertEqual(benchmark.compare(results, results), [])
+        slower = {name: dict(row, p95_ms=row['p95_ms'] / 2, queries=row['queries'] - 1) for name, row in results.items()}
+        self.assertTrue(benchmark.compare(results, slower))
+
+    def test_benchmark_needs_iterations(self):
+        with self.assertRaisesMessage(CommandError, '--iterations must be at least 1'):
+            call_command('benchmark_endpoints', iterations=0, anonymous=True, stdout=io.StringIO())
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(samples, 0.5), 50)
+        self.assertEqual(benchmark.percentile(samples, 0.99), 99)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class QueryMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=3, reviews_per_product=2)
+        cls.user = make_user(0)
+        for _ in range(2):
+            order = Order.objects.create(user=cls.user, status='pending')
+            OrderItem.objects.bulk_create([OrderItem(order=order, farm_product=fp, quantity=1) for fp in cls.farm_products])
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.client = APIClient()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/v1/farmers/')
+        self.assertRegex(response['Server-Timing'], r'sql;dur=[\d.]+;desc="\d+ queries, 0 duplicates", serialize;dur=[\d.]+, total;dur=[\d.]+')
+
+    def test_metrics_endpoint_reports_duplicate_queries(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/v1/orders/')
+        # Without its prefetch every order loads its lines on its own.
+        with mock.patch.object(OrderViewSet, 'get_queryset', lambda view: Order.objects.filter(user=view.request.user)):
+            self.client.get('/api/v1/orders/')
+        self.client.get('/api/v1/farm-products/')
+
+        admin = User.objects.create_superuser(email_or_phone='admin@example.com', username='admin', name='Admin', password='secret')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['FarmProductViewSet.list']['samples'], 1)
+        self.assertEqual(response.data['FarmProductViewSet.list']['duplicate_queries'], [])
+        self.assertTrue(response.data['OrderViewSet.list']['duplicate_queries'])
+        self.assertEqual(sum(response.data['OrderViewSet.list']['histogram'].values()), 2)
+
+    def test_metrics_endpoint_requires_admin(self):
+        self.assertIn(self.client.get('/api/v1/metrics/').status_code, (401, 403))
+
+    def test_serialization_is_timed_at_the_view(self):
+        response = self.client.get('/api/v1/farm-products/')
+        serialize_ms = float(re.search(r'serialize;dur=([\d.]+)', response['Server-Timing']).group(1))
+        self.assertGreater(serialize_ms, 0)
+        # DRF itself is left alone for code outside the views.
+        self.assertEqual(serializers.Serializer.data.fget.__module__, 'rest_framework.serializers')
+
+    async def test_async_views_count_their_queries(self):
+        response = await self.async_client.get('/api/v1/async/farm-products/')
+        queries = int(re.search(r'"(\d+) queries', response['Server-Timing']).group(1))
+        self.assertGreater(queries, 0)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get('/api/v1/farmers/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(metrics.registry.snapshot(), {})
+
+
+class AsyncReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=7, reviews_per_product=6)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_list_matches_sync_endpoint(self):
+        response = await self.async_client.get('/api/v1/async/farm-products/', {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        expected = (await self.async_client.get('/api/v1/farm-products/', {'page_size': 3})).json()
+        self.assertEqual(response.json()['results'], expected['results'])
+
+    async def test_cursor_walks_whole_catalog(self):
+        seen = []
+        url = '/api/v1/async/farm-products/?page_size=3'
+        while url:
+            data = (await self.async_client.get(url)).json()
+            seen.extend(item['id'] for item in data['results'])
+            self.assertTrue(all(len(item['reviews']) == FarmProductViewSet.review_preview_limit for item in data['results']))
+            url = data['next']
+        self.assertEqual(sorted(seen), sorted(fp.id for fp in self.farm_products))
+
+    async def test_errors_are_json(self):
+        response = await self.async_client.get('/api/v1/async/farm-products/0/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Not found.'})
+        response = await self.async_client.get('/api/v1/async/farm-products/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_search_and_cached_detail(self):
+        response = await self.async_client.get('/api/v1/async/search/', {'q': 'product'})
+        self.assertEqual(response.json()['count'], len(self.farm_products))
+
+        url = f'/api/v1/async/farm-products/{self.farm_products[0].pk}/'
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=5, reviews_per_product=0)
+        cls.user = make_user(0)
+        order = Order.objects.create(user=cls.user, status='pending')
+        OrderItem.objects.bulk_create([OrderItem(order=order, farm_product=fp, quantity=1) for fp in cls.farm_products[:2]])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_incremental_catalog_export(self):
+        response = self.client.get('/api/v1/exports/farm-products/')
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual([row['id'] for row in rows], [fp.id for fp in self.farm_products])
+
+        changed = self.farm_products[2]
+        changed.price = Decimal('9.99')
+        changed.save()
+        response = self.client.get('/api/v1/exports/farm-products/', {'since': response['X-Export-Watermark']})
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual([(row['id'], row['price']) for row in rows], [(changed.id, '9.99')])
+
+    def test_order_export_as_csv(self):
+        admin = User.objects.create_superuser(email_or_phone='admin@example.com', username='admin', name='Admin', password='secret')
+        self.client.force_authenticate(admin)
+        lines = self.lines(self.client.get('/api/v1/exports/orders/', {'output': 'csv'}))
+        self.assertTrue(lines[0].startswith('id,user_id,status'))
+        self.assertEqual(len(lines), 3)
+
+    async def test_export_streams_under_asgi(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = await self.async_client.get('/api/v1/exports/farm-products/')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [fp.id for fp in self.farm_products])
+
+    def test_order_export_requires_admin(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/v1/exports/orders/').status_code, 403)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/v1/exports/farm-products/', {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/exports/farm-products/', {'output': 'xml'}).status_code, 400)
+
+
+class CatalogImportTests(TestCase):
+    FARMERS = 'external_id,name,description\nF1,Hari,Grows rice\n'
+    FARMS = 'external_id,farmer,name,description,location\nFM1,F1,Hill Farm,Terraces,Ilam\nFM2,F9,Lost Farm,Nowhere,Ilam\n'
+    PRODUCTS = '{"external_id": "P1", "name": "Red Apple", "description": "Crisp", "type": "fruit"}\nnot json\n'
+
+    def import_files(self, farm_products):
+        return imports.import_files({
+            'farmers': (io.StringIO(self.FARMERS), 'csv'),
+            'farms': (io.StringIO(self.FARMS), 'csv'),
+            'products': (io.StringIO(self.PRODUCTS), 'ndjson'),
+            'farm_products': (io.StringIO(farm_products), 'csv'),
+        }, batch_size=2)
+
+    def test_upserts_and_reports_row_errors(self):
+        report = self.import_files(
+            'external_id,farm,product,quantity,price,label\n'
+            'FP1,FM1,P1,10,2.50,\nFP2,FM1,P1,5,3.00,Organic\nFP3,FM1,P1,-1,abc,\n'
+        )
+        self.assertEqual(report['farms']['failed'], 1)
+        self.assertEqual(report['farms']['errors'][0]['row'], 3)
+        self.assertEqual(report['products']['errors'][0]['row'], 2)
+        self.assertEqual((report['farm_products']['created'], report['farm_products']['failed']), (2, 1))
+        self.assertEqual(set(report['farm_products']['errors'][0]['errors']), {'quantity', 'price'})
+
+        report = self.import_files('external_id,farm,product,quantity,price,label\nFP1,FM1,P1,7,9.99,Sale\n')
+        self.assertEqual((report['farm_products']['created'], report['farm_products']['updated']), (0, 1))
+        farm_product = FarmProduct.objects.get(external_id='FP1')
+        self.assertEqual((farm_product.quantity, farm_product.price, farm_product.label), (7, Decimal('9.99'), 'Sale'))
+        self.assertEqual(FarmProduct.objects.count(), 2)
+        self.assertTrue(SearchToken.objects.filter(farm_product=farm_product, token='apple').exists())
+
+        report = self.import_files('external_id,farm,product,quantity,price,label\nFP2,FM1,P1,4,,\n')
+        self.assertEqual((report['farm_products']['updated'], report['farm_products']['failed']), (1, 0))
+        farm_product = FarmProduct.objects.get(external_id='FP2')
+        self.assertEqual((farm_product.quantity, farm_product.price, farm_product.label), (4, Decimal('3.00'), 'Organic'))
+
+    def test_no_queries_per_row(self):
+        def query_count(rows):
+            body = 'external_id,farm,product,quantity,price,label\n' + ''.join(
+                f'FP{i},FM1,P1,1,1.00,\n' for i in range(rows)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                imports.CatalogImporter(batch_size=1000).run(
+                    'farm_products', imports.read_rows(io.StringIO(body), 'csv')
+                )
+            return len(ctx.captured_queries)
+
+        self.import_files('')
+        # Only SQLite's bind parameter limit splits the inserts further.
+        self.assertLess(query_count(300), 30)
+
+    def test_upload_endpoint(self):
+        admin = User.objects.create_superuser(email_or_phone='admin@example.com', username='admin', name='Admin', password='secret')
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('farmers.csv', self.FARMERS.encode())
+        response = client.post('/api/v1/imports/catalog/', {'farmers': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['farmers']['created'], 1)
+        self.assertEqual(Farmer.objects.get(external_id='F1').name, 'Hari')
+
+        upload = SimpleUploadedFile('farmers.csv', 'external_id,name,description\nF2,Sí,Grows rice\n'.encode('latin-1'))
+        response = client.post('/api/v1/imports/catalog/', {'farmers': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['farmers'], 'The file must be UTF-8 encoded.')
+        self.assertFalse(Farmer.objects.filter(external_id='F2').exists())
+
+
+@override_settings(ROLLUP_SETTLE_SECONDS=0)
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=3, reviews_per_product=0)
+        cls.user = make_user(0)
+
+    def place_order(self, lines, status='pending'):
+        order = Order.objects.create(user=self.user, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, farm_product=farm_product, quantity=quantity, unit_price=farm_product.price)
+            for farm_product, quantity in lines
+        ])
+        return order
+
+    def test_incremental_rollups_match_backfill(self):
+        first, second, third = self.farm_products
+        self.place_order([(first, 2), (second, 1)])
+        self.place_order([(third, 5)], status='cancelled')
+        analytics.update_rollups()
+        self.place_order([(first, 1)])
+        analytics.update_rollups()
+        self.assertEqual(analytics.update_rollups(until=timezone.now() - timedelta(days=1)), 0)
+
+        incremental = sorted(DailySales.objects.values_list('farm_product_id', 'units', 'revenue', 'order_count'))
+        self.assertEqual(incremental, [
+            (first.pk, Decimal('3.00'), Decimal('7.50'), 2),
+            (second.pk, Decimal('1.00'), Decimal('2.50'), 1),
+        ])
+        analytics.backfill()
+        self.assertEqual(sorted(DailySales.objects.values_list('farm_product_id', 'units', 'revenue', 'order_count')), incremental)
+
+    def test_reports_only_read_rollups(self):
+        first, second, _ = self.farm_products
+        self.place_order([(first, 4), (second, 1)])
+        analytics.update_rollups()
+        admin = User.objects.create_superuser(email_or_phone='admin@example.com', username='admin', name='Admin', password='secret')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/v1/analytics/top-sellers/', {'by': 'revenue'})
+        self.assertFalse(any('fresh_harvest_orderitem' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual([row['product_id'] for row in response.data], [first.product_id, second.product_id])
+
+        response = client.get('/api/v1/analytics/revenue/', {'group': 'farm'})
+        self.assertEqual(response.data[0]['revenue'], Decimal('12.50'))
+        response = client.get('/api/v1/analytics/stock-depletion/', {'days': 2})
+        self.assertEqual(response.data[0], {
+            'farm_product_id': first.pk, 'quantity': 10, 'units_per_day': Decimal('2.00'), 'days_left': Decimal('5.0'),
+        })
+        self.assertEqual(client.get('/api/v1/analytics/revenue/', {'start': 'soon'}).status_code, 400)
+
+
+class RecipeCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=3, reviews_per_product=0)
+        cls.user = make_user(0)
+        other_farm = Farm.objects.create(farmer=Farmer.objects.get(), name='Other', description='', location='Hill')
+        # A cheaper offer of the first product, and nothing in stock for the third.
+        cls.cheaper = FarmProduct.objects.create(farm=other_farm, product=cls.farm_products[0].product,
+                                                 quantity=3, price=Decimal('1.00'))
+        cls.farm_products[2].quantity = 0
+        cls.farm_products[2].save()
+        cls.recipe = Recipe.objects.create(name='Salad')
+        cls.recipe.products.set([fp.product for fp in cls.farm_products])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_offers_follow_stock_and_price(self):
+        first, second, third = self.farm_products
+        self.assertEqual(ProductOffer.objects.get(product=first.product).farm_product_id, self.cheaper.pk)
+        self.assertFalse(ProductOffer.objects.filter(product=third.product).exists())
+
+        self.cheaper.quantity = 0
+        self.cheaper.save()
+        self.assertEqual(ProductOffer.objects.get(product=first.product).farm_product_id, first.pk)
+        first.delete()
+        self.assertFalse(ProductOffer.objects.filter(product=first.product).exists())
+
+        fill_cart(self.user, [second], quantity=10)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post('/api/v1/orders/', {}).status_code, 201)
+        tasks.run_pending()
+        self.assertFalse(ProductOffer.objects.filter(product=second.product).exists())
+
+    def test_ingredients_resolve_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/v1/recipe/{self.recipe.pk}/ingredients/')
+        self.assertEqual(len(ctx.captured_queries), 2)
+        offers = [row['best_offer'] and row['best_offer']['farm_product'] for row in response.data]
+        self.assertEqual(offers, [self.cheaper.pk, self.farm_products[1].pk, None])
+
+    def test_add_to_cart(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/v1/recipe/{self.recipe.pk}/add-to-cart/'
+        self.client.post(url, {'quantity': 2}, format='json')
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unavailable'], [self.farm_products[2].product_id])
+        quantities = {line['farm_product_id']: line['quantity'] for line in response.data['cart']['items']}
+        self.assertEqual(quantities, {self.cheaper.pk: 3, self.farm_products[1].pk: 3})
+        self.assertEqual(self.client.post(url, {'quantity': 0}, format='json').status_code, 400)
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=4, reviews_per_product=3)
+        cls.user = make_user(0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, farm_products):
+        Cart.objects.filter(user=self.user).delete()
+        fill_cart(self.user, farm_products, quantity=2)
+        response = self.client.post('/api/v1/orders/', {})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def history_query_count(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/orders/', {'page_size': page_size})
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_lines_keep_checkout_price_and_name(self):
+        order_id = self.checkout(self.farm_products[:2])
+        farm_product = self.farm_products[0]
+        farm_product.price = Decimal('99.00')
+        farm_product.save()
+        farm_product.product.name = 'Renamed'
+        farm_product.product.save()
+
+        response = self.client.get(f'/api/v1/orders/{order_id}/')
+        line = response.data['order_items'][0]
+        self.assertEqual(
+            (line['product_name'], line['unit_price'], line['line_total']), ('Product 0', '2.50', '5.00')
+        )
+        self.assertEqual(response.data['total_bill'], '10.00')
+
+    def test_history_is_paged_newest_first_with_constant_queries(self):
+        order_ids = [self.checkout(self.farm_products[i:i + 2]) for i in range(3)]
+        response = self.client.get('/api/v1/orders/', {'page_size': 2})
+        self.assertEqual([order['id'] for order in response.data['results']], order_ids[:0:-1])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], order_ids[:1])
+        self.assertEqual(self.history_query_count(1), self.history_query_count(3))
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_products = make_catalog(products=3, reviews_per_product=2)
+        cls.user = make_user(0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, path, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_unrequested_relations_are_not_queried(self):
+        data, sql = self.get('/api/v1/farm-products/', {'fields': 'id,price,product.name'})
+        self.assertEqual(data['results'][0], {
+            'id': self.farm_products[-1].pk, 'price': '2.50', 'product': {'name': 'Product 2'},
+        })
+        self.assertIn('fresh_harvest_product', sql)
+        for table in ('fresh_harvest_farm"', 'fresh_harvest_review', 'fresh_harvest_productimage'):
+            self.assertNotIn(table, sql)
+
+        data, sql = self.get('/api/v1/search/', {'q': 'product', 'fields': 'id,reviews.rating'})
+        self.assertEqual(data['results'][0]['reviews'], [{'rating': 4}, {'rating': 4}])
+        self.assertNotIn('fresh_harvest_productimage', sql)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/v1/farm-products/', {'fields': 'id,product.colour'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['fields'], 'Unknown field: product.colour')
+
+    def test_order_lines_expand_farm_product(self):
+        fill_cart(self.user, self.farm_products[:2], quantity=1)
+        self.assertEqual(self.client.post('/api/v1/orders/', {}).status_code, 201)
+
+        data, sql = self.get('/api/v1/orders/', {'fields': 'id,total_bill'})
+        self.assertEqual(set(data['results'][0]), {'id', 'total_bill'})
+        self.assertNotIn('fresh_harvest_orderitem', sql)
+
+        data, sql = self.get('/api/v1/orders/', {'expand': 'order_items.farm_product', 'fields': 'order_items.farm_product.farm.name'})
+        self.assertEqual(data['results'][0]['order_items'][0], {'farm_product': {'farm': {'name': 'Farm'}}})
+        self.assertNotIn('fresh_harvest_productimage', sql)
+
+    def test_cart_and_recipe_are_trimmed(self):
+        fill_cart(self.user, self.farm_products[:1], quantity=3)
+        data, _ = self.get('/api/v1/cart/', {'fields': 'subtotal,items.name'})
+        self.assertEqual(data, {'subtotal': '7.50', 'items': [{'name': 'Product 0'}]})
+
+        Recipe.objects.create(name='Salad').products.set([self.farm_products[0].product])
+        data, sql = self.get('/api/v1/recipe/', {'fields': 'name'})
+        self.assertEqual(data[0], {'name': 'Salad'})
+        self.assertNotIn('fresh_harvest_product', sql)
+
+
+class ImageRenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm_product = make_catalog(products=1, reviews_per_product=0)[0]
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_RENDITION_ROOT=f'{media}/renditions')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, name, size=(1200, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_upload_is_rendered_in_the_background(self):
+        name = self.upload('apple.png')
+        image = ProductImage.objects.create(product=self.farm_product, image=name)
+        self.assertEqual(renditions.rendition_data(image.renditions, name, 'card'), None)
+        tasks.run_pending()
+        image.refresh_from_db()
+        sizes = {kind: (image.renditions[kind]['width'], image.renditions[kind]['height'])
+                 for kind in ('thumbnail', 'card', 'full')}
+        self.assertEqual(sizes, {'thumbnail': (160, 107), 'card': (480, 320), 'full': (1200, 800)})
+        self.assertEqual(image.renditions['source'], name)
+
+        response = APIClient().get('/api/v1/farm-products/', {'fields': 'images'})
+        card = response.data['results'][0]['images'][-1]['rendition']
+        self.assertEqual((card['url'], card['width']), ('http://testserver/media/renditions/apple/card.webp', 480))
+        response = APIClient().get(f'/api/v1/farm-products/{self.farm_product.pk}/', {'image_size': 'thumbnail'})
+        self.assertEqual(response.data['images'][-1]['rendition']['width'], 160)
+        response = APIClient().get('/api/v1/farm-products/', {'image_size': 'huge'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_replaced_image_is_not_served_stale_renditions(self):
+        image = ProductImage.objects.create(product=self.farm_product, image=self.upload('pear.png'))
+        tasks.run_pending()
+        image.refresh_from_db()
+        image.image = 'missing.png'
+        image.save()
+        self.assertIsNone(renditions.rendition_data(image.renditions, image.image.name, 'card'))
+
+    def test_reused_and_late_uploads_are_rendered(self):
+        name = self.upload('fig.png', size=(300, 200))
+        ProductImage.objects.create(product=self.farm_product, image=name)
+        tasks.run_pending()
+        # Another row with the same file takes over the existing renditions.
+        reused = ProductImage.objects.create(product=self.farm_product, image=name)
+        self.assertEqual(tasks.run_pending(), 1)
+        reused.refresh_from_db()
+        self.assertEqual(reused.renditions['card']['width'], 300)
+
+        # A file missing at first is rendered once the row is saved again.
+        late = ProductImage.objects.create(product=self.farm_product, image='late.png')
+        tasks.run_pending()
+        self.upload('late.png')
+        late.save()
+        tasks.run_pending()
+        late.refresh_from_db()
+        self.assertEqual(late.renditions['source'], 'late.png')
+
+    def test_pending_render_is_queued_once(self):
+        name = self.upload('kiwi.png', size=(300, 200))
+        ProductImage.objects.bulk_create([ProductImage(product=self.farm_product, image=name) for _ in range(2)])
+        renditions.schedule(name)
+        renditions.schedule(name)
+        self.assertEqual(Task.objects.filter(name='render_image', kwargs__source=name).count(), 1)
+
+    def test_backfill_renders_each_upload_once(self):
+        name = self.upload('plum.png', size=(300, 200))
+        ProductImage.objects.bulk_create([ProductImage(product=self.farm_product, image=name) for _ in range(2)])
+        out = io.StringIO()
+        call_command('generate_renditions', stdout=out)
+        self.assertIn('Rendered 1 images, skipped 1 missing or unreadable.', out.getvalue())
+        rendered = ProductImage.objects.filter(image=name).values_list('renditions', flat=True)
+        self.assertEqual([meta['card']['width'] for meta in rendered], [300, 300])
+        self.assertEqual(renditions.pending_sources(), ['product_0.png'])
+
+
+@tasks.task('tests.create_farmer', max_attempts=2)
+def create_farmer(name, fail=False):
+    if fail:
+        raise ValueError(f'Cannot create {name}')
+    Farmer.objects.create(name=name, description='')
+
+
+class TaskQueueTests(TestCase):
+    def test_tasks_run_by_priority_once_per_key(self):
+        tasks.enqueue('tests.create_farmer', name='Late')
+        tasks.enqueue('tests.create_farmer', name='Urgent', priority=5, key='urgent')
+        tasks.enqueue('tests.create_farmer', name='Again', priority=5, key='urgent')
+        self.assertEqual([task.kwargs['name'] for task in tasks.claim('test', 10)], ['Urgent', 'Late'])
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_failed_task_backs_off_then_gives_up(self):
+        queued = tasks.enqueue('tests.create_farmer', name='Flaky', fail=True)
+        self.assertEqual(tasks.run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.PENDING, 1))
+        self.assertIn('ValueError: Cannot create Flaky', queued.last_error)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=5))
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        tasks.run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.FAILED, 2))
+
+    def test_expired_lease_is_claimed_again(self):
+        queued = tasks.enqueue('tests.create_farmer', name='Orphan')
+        tasks.claim('dead-worker', 1)
+        self.assertEqual(tasks.claim('other', 1), [])
+        Task.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tasks.run_pending('other'), 1)
+        self.assertTrue(Farmer.objects.filter(name='Orphan').exists())
+
+
+class TaskWorkerTests(TransactionTestCase):
+    def test_worker_processes_drain_the_queue(self):
+        for i in range(4):
+            tasks.enqueue('tests.create_farmer', name=f'Farmer {i}')
+        out = io.StringIO()
+        call_command('process_tasks', processes=2, once=True, stdout=out)
+        self.assertIn('Ran 4 tasks.', out.getvalue())
+        self.assertEqual(Farmer.objects.count(), 4)
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {Task.DONE})
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(0)
+        cls.user.location = 'A long delivery address'
+        cls.user.save()
+
+    def setUp(self):
+        authentication.get_user_cache().clear()
+        throttling.reset()
+        self.client = APIClient()
+        response = self.client.post('/api/v1/auth/token/', {'email_or_phone': 'buyer0@example.com', 'password': 'secret'})
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/orders/')
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in ctx.captured_queries if 'FROM "fresh_harvest_user"' in query['sql']]
+
+    def test_user_is_loaded_once_and_without_unused_fields(self):
+        first = self.user_queries()
+        self.assertEqual(len(first), 1)
+        self.assertNotIn('location', first[0])
+        self.assertEqual(self.user_queries(), [])
+
+        user = authentication.get_cached_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.location, 'A long delivery address')
+
+    def test_token_carries_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['user_id'], token['name'], token['is_staff']), (str(self.user.pk), 'Buyer 0', False))
+
+    def test_saving_a_user_drops_its_cache_entry(self):
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/orders/').status_code, 401)
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(0)
+
+    def setUp(self):
+        throttling.reset()
+        self.client = APIClient()
+
+    def login(self, identifier='buyer0@example.com', password='secret', **extra):
+        return self.client.post('/api/v1/auth/token/', {'email_or_phone': identifier, 'password': password}, **extra)
+
+    def test_legacy_hash_is_upgraded_at_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret', hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+        self.assertTrue(self.user.check_password('secret'))
+
+    def test_attempts_are_throttled_per_identifier(self):
+        statuses = [self.login(password='wrong').status_code for _ in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.login('buyer1@example.com').status_code, 401)
+
+    def test_body_that_is_not_an_object_is_rejected(self):
+        response = self.client.post('/api/v1/auth/token/', ['buyer0@example.com', 'secret'], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(LOGIN_THROTTLE_PER_IP=(2, 0.01))
+    def test_attempts_are_throttled_per_ip(self):
+        statuses = [self.login(f'someone{i}@example.com').status_code for i in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    @override_settings(LOGIN_THROTTLE_PER_IP=(2, 0.01))
+    def test_forwarded_for_header_does_not_dodge_the_ip_limit(self):
+        statuses = [
+            self.login(f'someone{i}@example.com', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
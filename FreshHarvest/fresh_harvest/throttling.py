@@ -0,0 +1,90 @@
+"""In-process token bucket throttles for the token endpoints.
+
+Each client key gets a bucket of ``burst`` tokens that refills at a steady
+rate; a request takes one token and is refused with a 429 while the bucket
+is empty. Buckets live in process memory, so the limits apply per worker
+process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBuckets:
+    """Buckets per key, forgetting the least recently used beyond ``max_keys``."""
+
+    def __init__(self, burst, refill_rate, max_keys=100000):
+        self.burst = burst
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token for ``key``; return 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.refill_rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.refill_rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_buckets(setting):
+    with _buckets_lock:
+        if setting not in _buckets:
+            _buckets[setting] = TokenBuckets(*getattr(settings, setting))
+        return _buckets[setting]
+
+
+def reset():
+    with _buckets_lock:
+        _buckets.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle on the bucket of ``get_key``; ``rate_setting`` names its (burst, rate)."""
+    rate_setting = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if key is None:
+            return True
+        self._wait = get_buckets(self.rate_setting).take(key)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class LoginIdentifierThrottle(TokenBucketThrottle):
+    rate_setting = 'LOGIN_THROTTLE_PER_IDENTIFIER'
+
+    def get_key(self, request):
+        if not isinstance(request.data, Mapping):
+            return None
+        identifier = request.data.get('email_or_phone')
+        if not isinstance(identifier, str) or not identifier.strip():
+            return None
+        return identifier.strip().lower()
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    rate_setting = 'LOGIN_THROTTLE_PER_IP'
+
+    def get_key(self, request):
+        return self.get_ident(request)
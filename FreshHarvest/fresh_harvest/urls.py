@@ -1,16 +1,26 @@
 from rest_framework.routers import DefaultRouter
-from .views import CartItemViewSet, FarmProductViewSet, OrderViewSet, FarmerViewSet, DiscountViewSet, RecipeViewSet, SearchProductsViewSet, UserCreateViewSet
+from .views import AnalyticsViewSet, CatalogExportView, CatalogImportView, MetricsView, OrderExportView, CartItemViewSet, FarmProductViewSet, OrderViewSet, FarmerViewSet, DiscountViewSet, RecipeViewSet, ReviewViewSet, SearchProductsViewSet, ThrottledTokenObtainPairView, ThrottledTokenRefreshView, UserCreateViewSet
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from . import async_views
 
 router = DefaultRouter()
 
 urlpatterns = [
-    path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/token/refresh/', ThrottledTokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('exports/farm-products/', CatalogExportView.as_view(), name='export-farmproducts'),
+    path('exports/orders/', OrderExportView.as_view(), name='export-orders'),
+    path('imports/catalog/', CatalogImportView.as_view(), name='import-catalog'),
+    path('async/farm-products/', async_views.farm_product_list, name='async-farmproduct-list'),
+    path('async/farm-products/<int:pk>/', async_views.farm_product_detail, name='async-farmproduct-detail'),
+    path('async/search/', async_views.search_list, name='async-search-list'),
+    path('async/farmers/', async_views.farmer_list, name='async-farmer-list'),
+    path('async/farmers/<int:pk>/', async_views.farmer_detail, name='async-farmer-detail'),
+    path('async/recipe/', async_views.recipe_list, name='async-recipe-list'),
+    path('async/recipe/<int:pk>/', async_views.recipe_detail, name='async-recipe-detail'),
+    path('async/discounts/', async_views.discount_list, name='async-discount-list'),
+    path('async/discounts/<str:coupon_code>/', async_views.discount_detail, name='async-discount-detail'),
 ]
 
 router.register('users', UserCreateViewSet, basename='user')
@@ -21,5 +31,7 @@ router.register('farmers', FarmerViewSet, basename='farmer')
 router.register('discounts', DiscountViewSet, basename='discount')
 router.register('search',SearchProductsViewSet,basename='search')
 router.register('recipe',RecipeViewSet,basename='recipe')
+router.register('reviews',ReviewViewSet,basename='review')
+router.register('analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns += router.urls
@@ -1,34 +1,64 @@
+import io
+import math
+from decimal import Decimal
+
 from rest_framework import viewsets, status, permissions,mixins
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from .models import Farmer, FarmProduct, Cart, CartItem, Discount, Order, Review,User,Recipe
+from .models import Farmer, Farm, FarmProduct, Cart, CartItem, Discount, Order, OrderItem, Product, ProductImage, Review,User,Recipe
 from .serializers import (
-    CartSerializer, CartItemAddSerializer, FarmProductSerializer, FarmProductSimpleSerializer,
+    CartItemAddSerializer, CartItemQuantitySerializer, CartBulkSerializer, FarmProductSerializer,
+    FarmProductSimpleSerializer,
     OrderCreateSerializer, OrderDetailSerializer, FarmerSerializer,
-    DiscountSerializer, OrderSerializer, RecipeSerializer, ReviewSerializer, UserSerializer
+    DiscountSerializer, OrderSerializer, RecipeCartSerializer, RecipeIngredientSerializer, RecipeSerializer,
+    ReviewSerializer, UserSerializer
 )
+from .caching import CachedResponseMixin
+from .fieldsets import FieldSelection, FieldSelectionMixin
+from .metrics import SerializerTimingMixin
+from .pagination import FarmProductCursorPagination, OrderCursorPagination, ReviewCursorPagination, SearchPagination
+from .routers import ReplicaReadMixin
+from .throttling import LoginIdentifierThrottle, LoginIPThrottle
+from . import analytics, carts, counters, exports, imports, metrics, reservations, search
+
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = [LoginIdentifierThrottle, LoginIPThrottle]
+
+
+class ThrottledTokenRefreshView(TokenRefreshView):
+    throttle_classes = [LoginIPThrottle]
+
 
-class UserCreateViewSet(mixins.CreateModelMixin,viewsets.GenericViewSet):
+class UserCreateViewSet(SerializerTimingMixin, mixins.CreateModelMixin,viewsets.GenericViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
 
 
 
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(SerializerTimingMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = CartItemAddSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return CartItem.objects.filter(cart=cart).select_related('product')
+        return CartItem.objects.filter(cart__user=self.request.user).select_related('product')
 
     def list(self, request, *args, **kwargs):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        # The snapshot is cached whole, so it is trimmed after the fact.
+        selection = FieldSelection.from_params(request.query_params)
+        return Response(selection.filter(carts.get_snapshot(request.user)))
 
     def create(self, request, *args, **kwargs):
         cart, _ = Cart.objects.get_or_create(user=request.user)
@@ -38,53 +68,164 @@ class CartItemViewSet(viewsets.ModelViewSet):
         farm_product = get_object_or_404(FarmProduct, id=serializer.validated_data['farm_product_id'])
         quantity = serializer.validated_data['quantity']
 
-        cart_item, _ = CartItem.objects.get_or_create(cart=cart, product=farm_product)
-        cart_item.quantity = quantity
-        cart_item.save()
+        short = reservations.set_quantities(cart, {farm_product.pk: quantity})
+        if short:
+            raise ValidationError({'quantity': f'Only {short[farm_product.pk]} available.'})
+        carts.invalidate_cart(request.user.pk)
         return Response({"message": "Item added to cart successfully"}, status=status.HTTP_201_CREATED)
 
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
-        quantity = request.data.get('quantity')
-        if quantity is not None:
-            instance.quantity = quantity
-            instance.save()
-            return Response({"message":f"Quantity updated susscessfully {quantity}"}, status=status.HTTP_200_OK)
-        return Response({"error" : "No fields to Update "},status=status.HTTP_400_BAD_REQUEST)
+        serializer = CartItemQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        short = reservations.set_quantities(instance.cart, {instance.product_id: quantity})
+        if short:
+            raise ValidationError({'quantity': f'Only {short[instance.product_id]} available.'})
+        carts.invalidate_cart(request.user.pk)
+        return Response({"message":f"Quantity updated susscessfully {quantity}"}, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.delete()
+        carts.invalidate_cart(request.user.pk)
         return Response({"message": "Cart item removed successfully"}, status=status.HTTP_200_OK)
-      
-
-class FarmProductViewSet(viewsets.ModelViewSet):
-        queryset = FarmProduct.objects.select_related('farm', 'product').prefetch_related('images', 'reviews')
-        serializer_class = FarmProductSerializer 
-        
-        def retrieve(self, request, pk=None):
-            try:
-                product = FarmProduct.objects.get(pk=pk)
-            except product.DoesNotExist:
-                return Response({"error" : "No Such Product"},status=status.HTTP_204_NO_CONTENT)
-            serializer = FarmProductSerializer(product)
-            return Response(serializer.data)
-
-
-class SearchProductsViewSet(viewsets.ReadOnlyModelViewSet):
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = CartBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        serializer.save(cart=cart)
+        return Response(carts.get_snapshot(request.user), status=status.HTTP_200_OK)
+
+
+def get_number_param(params, name, cast):
+    try:
+        value = cast(params[name])
+        if math.isfinite(value):
+            return value
+    except (TypeError, ValueError, ArithmeticError):
+        pass
+    raise ValidationError({name: 'A valid number is required.'})
+
+
+def get_date_param(params, name):
+    if not params.get(name):
+        return None
+    try:
+        value = parse_date(params[name])
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: 'A date in YYYY-MM-DD format is required.'})
+    return value
+
+
+def farm_product_relations(queryset, selection, review_limit=None):
+    """Select and prefetch just the relations ``selection`` renders."""
+    related = [name for name in ('farm', 'product') if selection.includes(name)]
+    if related:
+        queryset = queryset.select_related(*related)
+    if selection.includes('images'):
+        queryset = queryset.prefetch_related('images')
+    if selection.includes('reviews'):
+        queryset = queryset.prefetch_related(reviews_prefetch(review_limit))
+    return queryset
+
+
+def search_queryset(params, review_limit, selection=None):
+    queryset = farm_product_relations(FarmProduct.objects.all(), selection or FieldSelection(), review_limit)
+    if params.get('type'):
+        queryset = queryset.filter(product__type__iexact=params['type'])
+    if params.get('farm'):
+        queryset = queryset.filter(farm_id=get_number_param(params, 'farm', int))
+    if params.get('min_price'):
+        queryset = queryset.filter(price__gte=get_number_param(params, 'min_price', Decimal))
+    if params.get('max_price'):
+        queryset = queryset.filter(price__lte=get_number_param(params, 'max_price', Decimal))
+    if params.get('min_rating'):
+        queryset = queryset.filter(rating_avg__gte=get_number_param(params, 'min_rating', Decimal))
+
+    text = params.get('q') or params.get('name')
+    if text:
+        return search.search(queryset, text)
+    return queryset.order_by('-created_at', '-id')
+
+
+def reviews_prefetch(limit=None):
+    reviews = Review.objects.select_related('user').order_by('-created_at', '-id')
+    if limit is None:
+        return Prefetch('reviews', queryset=reviews)
+    # A sliced prefetch has to land on its own attribute, which
+    # FarmProductSerializer prefers over the full reviews relation.
+    return Prefetch('reviews', queryset=reviews[:limit], to_attr='recent_reviews')
+
+
+class FarmProductViewSet(SerializerTimingMixin, ReplicaReadMixin, FieldSelectionMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = FarmProduct.objects.all()
     serializer_class = FarmProductSerializer
+    pagination_class = FarmProductCursorPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['created_at', 'price', 'rating_avg', 'rating_count']
+    ordering = ('-created_at', '-id')
+    review_preview_limit = 5
+    cache_models = (FarmProduct, Farm, Product, ProductImage, Review)
+
     def get_queryset(self):
-        queryset = FarmProduct.objects.all()
-        product_name = self.request.query_params.get('name')
-        if product_name:
-            queryset = queryset.filter(product__name__icontains=product_name)
-        return queryset
+        queryset = super().get_queryset()
+        if self.request.query_params.get('min_rating'):
+            queryset = queryset.filter(rating_avg__gte=get_number_param(self.request.query_params, 'min_rating', Decimal))
+        # Only a preview of the newest reviews is embedded in the listing,
+        # the full set is paged through the reviews action below.
+        review_limit = self.review_preview_limit if self.action == 'list' else None
+        return farm_product_relations(queryset, self.field_selection, review_limit)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            # Grids get card sized images, a product page the full rendition.
+            context['image_size'] = 'full'
+        return context
+
+    @action(detail=True, methods=['get'], pagination_class=ReviewCursorPagination)
+    def reviews(self, request, pk=None):
+        queryset = Review.objects.filter(farm_product_id=pk).select_related('user')
+        page = self.paginate_queryset(queryset)
+        serializer = ReviewSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SearchProductsViewSet(SerializerTimingMixin, ReplicaReadMixin, FieldSelectionMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = FarmProductSerializer
+    pagination_class = SearchPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['price', 'rating_avg', 'rating_count']
+    review_preview_limit = FarmProductViewSet.review_preview_limit
+
+    def get_queryset(self):
+        return search_queryset(self.request.query_params, self.review_preview_limit, self.field_selection)
+
+class OrderViewSet(SerializerTimingMixin, ReplicaReadMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user)
+        selection = self.field_selection
+        if self.action in ['list', 'retrieve'] and selection.includes('order_items'):
+            # Lines carry their own price and names, so history only joins
+            # into the catalog when a line's farm product is expanded.
+            items = OrderItem.objects.order_by('id')
+            if selection.expands('order_items.farm_product'):
+                farm_product = selection.child('order_items').child('farm_product')
+                items = items.select_related('farm_product', *(
+                    f'farm_product__{name}' for name in ('farm', 'product') if farm_product.includes(name)
+                ))
+                if farm_product.includes('images'):
+                    items = items.prefetch_related('farm_product__images')
+            return queryset.prefetch_related(Prefetch('order_items', queryset=items))
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -97,44 +238,183 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class FarmerViewSet(viewsets.ReadOnlyModelViewSet):
+class FarmerViewSet(SerializerTimingMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Farmer.objects.all().order_by('name')
     serializer_class = FarmerSerializer
+    cache_models = (Farmer,)
 
 
-class DiscountViewSet(viewsets.ReadOnlyModelViewSet):
+class DiscountViewSet(SerializerTimingMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     lookup_field = 'coupon_code'
     queryset = Discount.objects.all()
     serializer_class = DiscountSerializer
+    cache_models = (Discount,)
 
 
-class RecipeViewSet(viewsets.ReadOnlyModelViewSet):
+class RecipeViewSet(SerializerTimingMixin, ReplicaReadMixin, FieldSelectionMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    cache_models = (Recipe, Product)
 
+    def get_queryset(self):
+        if self.field_selection.includes('products'):
+            return self.queryset.prefetch_related('products')
+        return self.queryset
+
+    @action(detail=True, methods=['get'])
+    def ingredients(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        products = recipe.products.select_related('best_offer__farm_product__farm').order_by('pk')
+        return Response(RecipeIngredientSerializer(products, many=True).data)
+
+    @action(detail=True, methods=['post'], url_path='add-to-cart', permission_classes=[permissions.IsAuthenticated])
+    def add_to_cart(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        serializer = RecipeCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        result = serializer.save(cart=cart, recipe=recipe)
+        return Response({**result, 'cart': carts.get_snapshot(request.user)}, status=status.HTTP_200_OK)
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+
+class ReviewViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
+    # Reviews are only read and liked here; counters change through the
+    # atomic increments below, never through a plain update.
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
+    lookup_value_regex = r'\d+'
 
     @action(detail=True, methods=['patch'])
     def increase_like(self, request, pk=None):
-        review = self.get_object()
-        if serializer.is_valid():
-            review.likes += 1
-            review.save()
-            return Response({'status': 'like updated'},status=status.HTTP_202_ACCEPTED)
-        else:
-            return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+        return self.increment_counter(pk, 'likes')
 
     @action(detail=True, methods=['patch'])
     def increase_dislike(self, request, pk=None):
-        review = self.get_object()
-        if serializer.is_valid():
-            review.dislikes += 1
-            review.save()
-            return Response({'status': 'dislike updated'},status=status.HTTP_202_ACCEPTED)
-        else:
-            return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)  
-        
+        return self.increment_counter(pk, 'dislikes')
+
+    def increment_counter(self, pk, field):
+        if counters.write_behind_enabled():
+            # The click is only buffered; report the stored counts plus
+            # whatever this worker has not flushed yet.
+            counts = get_object_or_404(Review.objects.values(*counters.COUNTER_FIELDS), pk=pk)
+            buffer = counters.get_buffer()
+            buffer.add(int(pk), field)
+            pending = buffer.pending(int(pk))
+            counts = {name: counts[name] + pending[name] for name in counters.COUNTER_FIELDS}
+            return Response({'id': int(pk), **counts}, status=status.HTTP_202_ACCEPTED)
+
+        counts = counters.increment(pk, field)
+        if counts is None:
+            return Response({"error": "No Such Review"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'id': int(pk), **counts}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.registry.snapshot())
+
+
+class ExportView(APIView):
+    """Stream a full or incremental export as NDJSON or CSV.
+
+    Rows are read in chunks and written as they are produced, so memory use
+    does not grow with the table, under WSGI as well as ASGI, which gets an
+    async iterator over the same lines. The ``X-Export-Watermark`` header is
+    the ``since`` value for the next incremental export.
+    """
+    kind = None
+    chunk_size = 2000
+
+    def get(self, request):
+        params = request.query_params
+        output_format = params.get('output', 'ndjson')
+        if output_format not in exports.FORMATS:
+            raise ValidationError({'output': f"Choose one of: {', '.join(exports.FORMATS)}."})
+        since = None
+        if params.get('since'):
+            since = exports.parse_watermark(params['since'])
+            if since is None:
+                raise ValidationError({'since': 'An ISO 8601 datetime is required.'})
+
+        until = timezone.now()
+        lines = exports.stream(self.kind, output_format, since, until, self.chunk_size)
+        if isinstance(request._request, ASGIRequest):
+            lines = exports.aiterate(lines)
+        response = StreamingHttpResponse(lines, content_type=exports.CONTENT_TYPES[output_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.kind}.{output_format}"'
+        response['X-Export-Watermark'] = until.isoformat()
+        return response
+
+
+class CatalogExportView(ExportView):
+    permission_classes = [permissions.AllowAny]
+    kind = 'catalog'
+
+
+class OrderExportView(ExportView):
+    permission_classes = [permissions.IsAdminUser]
+    kind = 'orders'
+
+
+class CatalogImportView(APIView):
+    """Upsert catalog rows from uploaded CSV or NDJSON files.
+
+    Each kind is a separate file field (``farmers``, ``farms``, ``products``,
+    ``farm_products``); the format is taken from the file name.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        uploads = {kind: request.FILES[kind] for kind in imports.SPECS if kind in request.FILES}
+        if not uploads:
+            raise ValidationError({'detail': f"Upload at least one of: {', '.join(imports.SPECS)}."})
+        # Check the encoding up front, a decode error halfway through
+        # would leave the file partly imported.
+        for kind, upload in uploads.items():
+            if not imports.is_utf8(upload.chunks()):
+                raise ValidationError({kind: 'The file must be UTF-8 encoded.'})
+            upload.seek(0)
+        files = {
+            kind: (io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), imports.detect_format(upload.name))
+            for kind, upload in uploads.items()
+        }
+        return Response(imports.import_files(files))
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Sales reports served from the daily rollups only."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def date_range(self, request):
+        return get_date_param(request.query_params, 'start'), get_date_param(request.query_params, 'end')
+
+    def get_choice(self, request, name, choices, default):
+        value = request.query_params.get(name, default)
+        if value not in choices:
+            raise ValidationError({name: f"Choose one of: {', '.join(choices)}."})
+        return value
+
+    def get_limit(self, request, name, default, maximum=500):
+        if not request.query_params.get(name):
+            return default
+        return max(1, min(get_number_param(request.query_params, name, int), maximum))
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        group = self.get_choice(request, 'group', ('day', 'farm', 'product'), 'day')
+        return Response(analytics.revenue(group, *self.date_range(request)))
+
+    @action(detail=False, methods=['get'], url_path='top-sellers')
+    def top_sellers(self, request):
+        by = self.get_choice(request, 'by', ('units', 'revenue'), 'units')
+        start, end = self.date_range(request)
+        return Response(analytics.top_sellers(start, end, by=by, limit=self.get_limit(request, 'limit', 10)))
+
+    @action(detail=False, methods=['get'], url_path='stock-depletion')
+    def stock_depletion(self, request):
+        days = self.get_limit(request, 'days', 14, maximum=365)
+        return Response(analytics.stock_depletion(days=days, limit=self.get_limit(request, 'limit', 20)))